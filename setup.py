@@ -17,6 +17,7 @@ setup(
     author_email='funkypiwy@gmail.com',
     url='https://github.com/pierreyvesbaloche/rpi_aiy_zwaveme_assist',
     license=license,
+    python_requires='>=3.5',
     setup_requires=['pytest-runner'],
     tests_require=['pytest'],
     packages=find_packages(exclude=('tests', 'docs'))
@@ -0,0 +1,68 @@
+# Copyright 2017 Pierre-yves Baloche
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" Fixtures shared by the tests """
+import json
+
+import pytest
+
+from zwaveme_assist.helper import ZwaveMeHelper
+from zwaveme_assist.stub_server import ZAutomationStubServer
+
+
+def device(device_id, name, device_type="switchBinary"):
+    """Device as listed in the controller's locations"""
+    return ZwaveMeHelper.ZAutomationDevice({"id": device_id, "deviceName": name, "deviceType": device_type})
+
+
+def targets(command):
+    """Sorted ids of the devices targeted by a command, None without command"""
+    return None if command is None else sorted(target.id for target in command.devices)
+
+
+@pytest.fixture
+def grammar():
+    """Grammar of the helper's actions and levels, without any device"""
+    strategy = ZwaveMeHelper.APIDeviceActionStrategy
+    return ZwaveMeHelper.CommandGrammar("Wave", strategy.ACTIONS, None, strategy.LEVELS)
+
+
+@pytest.fixture
+def stub():
+    with ZAutomationStubServer(rooms=2, devices_per_room=3, seed=0) as server:
+        yield server
+    ZwaveMeHelper.AbstractAPIStrategy.close_sessions()
+    ZwaveMeHelper.AbstractAPIStrategy._breakers.clear()
+    ZwaveMeHelper.AbstractAPIStrategy._schedulers.clear()
+
+
+@pytest.fixture
+def credentials(stub, tmp_path):
+    path = str(tmp_path / "zaut_credentials.json")
+    stub.write_credentials(path)
+    return path
+
+
+@pytest.fixture
+def credentials_dict(credentials):
+    """The credentials, as the strategies take them"""
+    with open(credentials) as credentials_file:
+        return json.load(credentials_file)
+
+
+@pytest.fixture
+def helper(credentials):
+    helper = ZwaveMeHelper(credentials, cache_file_path=None)
+    helper.get_vocal_commands()
+    yield helper
+    helper.stop_refresh()
@@ -0,0 +1,82 @@
+# Copyright 2017 Pierre-yves Baloche
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" Tests of the group commands performed by batch scripts """
+import pytest
+
+from zwaveme_assist.helper import ZwaveMeHelper
+
+
+@pytest.fixture
+def strategy(credentials_dict, monkeypatch):
+    monkeypatch.setattr(ZwaveMeHelper.APIBatchActionStrategy, "MAX_BATCH", 2)
+    yield ZwaveMeHelper.APIDeviceActionStrategy(credentials_dict)
+    ZwaveMeHelper.APIBatchActionStrategy._support.clear()
+
+
+@pytest.fixture
+def sent(stub, monkeypatch, request):
+    """Paths of the requests received by the stand-in, the second script failing after being run"""
+    paths = []
+    handle = stub.handle
+    failure = getattr(request, "param", (500, "Simulated failure"))
+
+    def failing(path, headers=None, body=None):
+        paths.append(path)
+        answer = handle(path, headers, body)
+        if path.startswith(stub.SCRIPT_URL) and len(scripts(stub, paths)) == 2:
+            return failure
+        return answer
+    monkeypatch.setattr(stub, "handle", failing)
+    return paths
+
+
+def scripts(stub, paths):
+    return list(path for path in paths if path.startswith(stub.SCRIPT_URL))
+
+
+def commands(paths):
+    return list(path.split("/")[-1] for path in paths if "/command/" in path)
+
+
+def test_batches(stub, strategy):
+    devices = list(ZwaveMeHelper.ZAutomationDevice(device) for device in stub.devices)
+    done = strategy.apply_group(devices, "on")
+    assert done == dict((device.api_id, True) for device in devices)
+
+
+def test_failed_batch_falls_back_alone(stub, strategy, sent):
+    devices = list(ZwaveMeHelper.ZAutomationDevice(device) for device in stub.devices)
+    done = strategy.apply_group(devices, "on")
+    assert done == dict((device.api_id, True) for device in devices)
+    # Not retried, the first batch not sent again
+    assert len(scripts(stub, sent)) == 2
+    assert commands(sent) == ["on"] * 4
+
+
+def test_failed_relative_batch_is_not_sent_again(stub, strategy, sent):
+    devices = ZwaveMeHelper.AirtimeScheduler.interleave(
+        list(ZwaveMeHelper.ZAutomationDevice(device) for device in stub.devices))
+    done = strategy.apply_group(devices, "up")
+    assert list(done[device.api_id] for device in devices) == [True, True, False, False, True, True]
+    assert len(scripts(stub, sent)) == 2
+    assert commands(sent) == ["up"] * 2
+
+
+@pytest.mark.parametrize("sent", [(200, None), (200, ["switch"]), (200, "done")], indirect=True)
+def test_unexpected_script_result_fails_the_batch(stub, strategy, sent):
+    devices = ZwaveMeHelper.AirtimeScheduler.interleave(
+        list(ZwaveMeHelper.ZAutomationDevice(device) for device in stub.devices))
+    done = strategy.apply_group(devices, "up")
+    assert list(done[device.api_id] for device in devices) == [True, True, False, False, True, True]
+    assert commands(sent) == ["up"] * 2
@@ -0,0 +1,95 @@
+# Copyright 2017 Pierre-yves Baloche
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" Tests of the on-disk cache of the command table """
+import pytest
+
+from conftest import device
+from zwaveme_assist.helper import ZwaveMeHelper
+
+SERVER = "http://controller:8083"
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "zaut_commands.cache")
+
+
+@pytest.fixture
+def grammar(grammar):
+    grammar.add_device("Living Room", device("plug", "Plug Switch"), 1)
+    grammar.add_device("Living Room", device("dimmer", "Ceiling", "switchMultilevel"), 1)
+    grammar.add_device("Kitchen", device("door", "Back Door", "doorlock"), 2)
+    return grammar
+
+
+def inventory(locations):
+    return list((location.id, location.title, sorted((device.api_id, device.name, device.type)
+                                                     for devices in location.devices.values() for device in devices))
+                for location in locations)
+
+
+def test_round_trip(path, grammar):
+    ZwaveMeHelper.CommandCache(path, SERVER).save(grammar.inventory(), 1234)
+    locations, update_time = ZwaveMeHelper.CommandCache(path, SERVER).load()
+    assert update_time == 1234
+    assert inventory(locations) == [
+        (1, "Living Room", [("dimmer", "Ceiling", "switchMultilevel"), ("plug", "Plug Switch", "switchBinary")]),
+        (2, "Kitchen", [("door", "Back Door", "doorlock")])]
+
+
+def test_rebuilt_grammar_parses_the_same(path, grammar):
+    ZwaveMeHelper.CommandCache(path, SERVER).save(grammar.inventory())
+    locations, _ = ZwaveMeHelper.CommandCache(path, SERVER).load()
+    strategy = ZwaveMeHelper.APIDeviceActionStrategy
+    rebuilt = ZwaveMeHelper.CommandGrammar("Wave", strategy.ACTIONS, None, strategy.LEVELS)
+    for location in locations:
+        for devices in location.devices.values():
+            for room_device in devices:
+                rebuilt.add_device(location.title, room_device, location.id)
+    assert sorted(rebuilt.commands()) == sorted(grammar.commands())
+
+
+def test_missing_or_corrupted(path):
+    cache = ZwaveMeHelper.CommandCache(path, SERVER)
+    assert cache.load() is None
+    with open(path, "wb") as cache_file:
+        cache_file.write(ZwaveMeHelper.CommandCache.MAGIC + b"\x00")
+    assert cache.load() is None
+    with open(path, "wb") as cache_file:
+        cache_file.write(ZwaveMeHelper.CommandCache._HEADER.pack(cache.MAGIC, cache.VERSION) + b"not zlib")
+    assert cache.load() is None
+
+
+def test_other_version_is_ignored(path, grammar, monkeypatch):
+    ZwaveMeHelper.CommandCache(path, SERVER).save(grammar.inventory())
+    monkeypatch.setattr(ZwaveMeHelper.CommandCache, "VERSION", ZwaveMeHelper.CommandCache.VERSION + 1)
+    assert ZwaveMeHelper.CommandCache(path, SERVER).load() is None
+
+
+def test_other_server_is_ignored(path, grammar):
+    ZwaveMeHelper.CommandCache(path, SERVER).save(grammar.inventory())
+    assert ZwaveMeHelper.CommandCache(path, "http://other:8083").load() is None
+
+
+def test_warm_start(credentials, path):
+    cold = ZwaveMeHelper(credentials, cache_file_path=path)
+    commands = sorted(cold.get_vocal_commands())
+    warm = ZwaveMeHelper(credentials, cache_file_path=path)
+    try:
+        assert warm._commands is not None
+        assert sorted(warm.get_vocal_commands()) == commands
+    finally:
+        # Let the background revalidation end before the stand-in stops
+        with warm._refresh_lock:
+            pass
@@ -0,0 +1,90 @@
+# Copyright 2017 Pierre-yves Baloche
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" Tests of the daemon and its client """
+import socket
+import time
+
+import pytest
+
+from zwaveme_assist.daemon import Frames, ZwaveMeClient, ZwaveMeDaemon
+
+
+@pytest.fixture
+def daemon(helper, tmp_path):
+    with ZwaveMeDaemon(helper, str(tmp_path / "zaut.sock"), refresh_ttl=None) as daemon:
+        yield daemon
+
+
+def test_commands_round_trip(daemon):
+    with ZwaveMeClient(daemon.socket_path) as client:
+        commands = client.get_vocal_commands()
+        assert commands == list(daemon.helper.get_vocal_commands())
+        assert client.do_vocal_commands(commands[0])["done"]
+
+
+def test_invalid_request_keeps_the_connection(daemon):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(daemon.socket_path)
+        stream = connection.makefile("rwb")
+        for request in (["nope", None], "command", ["command"]):
+            Frames.write(stream, request)
+            assert Frames.read(stream) == {"ok": False, "result": "Invalid request"}
+        Frames.write(stream, ["commands", None])
+        assert Frames.read(stream)["ok"]
+
+
+def test_helper_failure_is_a_failed_result(daemon, monkeypatch):
+    def fail(order):
+        raise RuntimeError("broken")
+    with ZwaveMeClient(daemon.socket_path) as client:
+        monkeypatch.setattr(daemon.helper, "do_vocal_query", fail)
+        with pytest.raises(ValueError, match="RuntimeError: broken"):
+            client.do_vocal_query("wave is anything on")
+        monkeypatch.undo()
+        assert client.get_vocal_commands()
+
+
+def test_timeout_drops_the_late_answer(daemon, monkeypatch):
+    def slow():
+        time.sleep(0.5)
+        return []
+    with ZwaveMeClient(daemon.socket_path, timeout=0.1) as client:
+        monkeypatch.setattr(daemon.helper, "get_vocal_commands", slow)
+        with pytest.raises(socket.timeout):
+            client.get_vocal_commands()
+        monkeypatch.undo()
+        time.sleep(0.5)
+        assert client.get_vocal_commands() == list(daemon.helper.get_vocal_commands())
+
+
+def test_partial_orders_are_kept_per_connection(daemon, monkeypatch):
+    monkeypatch.setattr(daemon.helper, "_prewarm", lambda device: None)
+    first, second = "wave on switch 2 in room 1", "wave on switch 5 in room 2"
+    alone, other = ZwaveMeDaemon.Connection(), ZwaveMeDaemon.Connection()
+    assert daemon.handle(["partial", first], alone)["result"]
+    assert daemon.handle(["partial", second], other)["result"]
+    assert alone.partial is not other.partial
+    assert (alone.partial.prewarmed.name, other.partial.prewarmed.name) == ("Switch 2", "Switch 5")
+    assert daemon.handle(["command", first], alone)["ok"]
+    assert alone.partial is None and other.partial.candidates
+
+
+def test_partial_round_trip(daemon, monkeypatch):
+    monkeypatch.setattr(daemon.helper, "_prewarm", lambda device: None)
+    command = next(iter(daemon.helper.get_vocal_commands()))
+    with ZwaveMeClient(daemon.socket_path) as client, ZwaveMeClient(daemon.socket_path) as other:
+        assert client.feed_partial("wave") is None
+        assert other.feed_partial(command)
+        assert client.feed_partial(command) == other.feed_partial(command)
+        assert client.do_vocal_commands(command)["done"]
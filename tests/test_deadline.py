@@ -0,0 +1,79 @@
+# Copyright 2017 Pierre-yves Baloche
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" Tests of the orders' deadline """
+import time
+
+import pytest
+import requests
+
+from zwaveme_assist.helper import ZwaveMeHelper
+
+
+def test_deadline_of():
+    deadline = ZwaveMeHelper.Deadline(1.0)
+    assert ZwaveMeHelper.Deadline.of(deadline) is deadline
+    assert ZwaveMeHelper.Deadline.of(None) is None
+    assert ZwaveMeHelper.Deadline.of(2.0).budget == 2.0
+
+
+def test_deadline_bounds_the_timeouts():
+    deadline = ZwaveMeHelper.Deadline(1.0)
+    connect, read = deadline.timeout(3.05, 10.0)
+    assert 0.9 < connect <= 1.0 and 0.9 < read <= 1.0
+    assert ZwaveMeHelper.Deadline(60.0).timeout(3.05, 10.0) == (3.05, 10.0)
+
+
+def test_expired_deadline_refuses_the_request():
+    deadline = ZwaveMeHelper.Deadline(0.0)
+    assert deadline.expired and deadline.remaining() == 0.0
+    with pytest.raises(requests.Timeout):
+        deadline.timeout(3.05, 10.0)
+
+
+def test_expired_request_is_not_sent(stub, credentials, helper):
+    sent = stub.requests
+    strategy = ZwaveMeHelper.APIListLocationStrategy(helper.credentials)
+    with pytest.raises(ZwaveMeHelper.DeadlineExceeded):
+        strategy.apply(ZwaveMeHelper.Deadline(0.0))
+    assert stub.requests == sent
+    assert not strategy.breaker.is_open and strategy.breaker._failures == 0
+
+
+def test_slow_controller_fails_the_order_in_time(stub, helper):
+    command = next(iter(helper.get_vocal_commands()))
+    stub.latency = 0.5
+    start = time.monotonic()
+    result = helper.do_vocal_commands(command, deadline=0.2)
+    assert time.monotonic() - start < 0.45
+    assert not result and result.failures
+    assert result.remaining == 0.0
+
+
+def test_first_order_fetches_the_commands_within_its_deadline(stub, credentials):
+    helper = ZwaveMeHelper(credentials, cache_file_path=None)
+    stub.latency = 0.5
+    start = time.monotonic()
+    with pytest.raises(requests.Timeout):
+        helper.do_vocal_commands("wave on anything", deadline=0.2)
+    assert time.monotonic() - start < 0.45
+
+
+def test_slow_status_answers_the_query_in_time(stub, helper):
+    for device in stub.devices:
+        helper.states.update(device["id"], None)
+    stub.latency = 0.5
+    start = time.monotonic()
+    result = helper.do_vocal_query("wave is switch 2 on in room 1", deadline=0.2)
+    assert time.monotonic() - start < 0.45
+    assert result.device.name == "Switch 2" and result.value is None and result.answer is None
@@ -0,0 +1,71 @@
+# Copyright 2017 Pierre-yves Baloche
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" Tests of the fuzzy resolution of inexact orders """
+import pytest
+
+from conftest import device, targets
+from zwaveme_assist.helper import ZwaveMeHelper
+
+THRESHOLD = ZwaveMeHelper.FUZZY_THRESHOLD
+
+
+@pytest.fixture
+def grammar(grammar):
+    grammar.add_device("Living Room", device("plug", "Plug Switch"), 1)
+    grammar.add_device("Kitchen", device("lamp", "Lamp"), 2)
+    grammar.add_device("Kitchen", device("door", "Back Door", "doorlock"), 2)
+    return grammar
+
+
+def test_index_ranks_closest_first():
+    index = ZwaveMeHelper.FuzzyIndex()
+    index.add("living room", 1)
+    index.add("kitchen", 2)
+    index.add("dining room", 3)
+    results = index.search("livin room", 2)
+    assert results[0][1:] == ("living room", 1)
+    assert results[0][0] > results[1][0]
+
+
+def test_index_exact_match_scores_one():
+    index = ZwaveMeHelper.FuzzyIndex()
+    index.add("kitchen", 2)
+    assert index.search("kitchen", 1)[0][0] == pytest.approx(1.0)
+
+
+def test_resolve_misheard_order(grammar):
+    candidates = grammar.resolve("wave on plug switches in the living room", THRESHOLD)
+    command, score = candidates[0]
+    assert targets(command) == ["plug"]
+    assert command.action == "on"
+    assert THRESHOLD <= score < 1.0
+
+
+def test_resolve_needs_every_slot_to_match(grammar):
+    # A close device name does not make up for an unknown room
+    assert grammar.resolve("wave on lamp in garage", THRESHOLD) == []
+    assert grammar.resolve("wave on zz in kitchen", THRESHOLD) == []
+
+
+def test_resolve_filters_unsupported_actions(grammar):
+    assert grammar.resolve("wave lock lamps in kitchen", THRESHOLD) == []
+
+
+def test_resolve_many_prefers_exact_then_likeliest(grammar):
+    orders = ["wave on lamps in kitchen", "wave on lamp in kitchen"]
+    command, score, index = grammar.resolve_many(orders, THRESHOLD, 1)[0]
+    assert (score, index) == (1.0, 1)
+    command, score, index = grammar.resolve_many(["wave on lamps in kitchen", "wave on lampz in kitchen"],
+                                                 THRESHOLD, 1)[0]
+    assert index == 0
@@ -0,0 +1,103 @@
+# Copyright 2017 Pierre-yves Baloche
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" Tests of the vocal command grammar """
+import pytest
+
+from conftest import device, targets
+
+
+@pytest.fixture
+def grammar(grammar):
+    grammar.add_device("Living Room", device("plug", "Plug Switch"), 1)
+    grammar.add_device("Living Room", device("dimmer", "Ceiling", "switchMultilevel"), 1)
+    grammar.add_device("Kitchen", device("lamp", "Lamp"), 2)
+    grammar.add_device("Kitchen", device("door", "Back Door", "doorlock"), 2)
+    return grammar
+
+
+def test_parse_device_in_room(grammar):
+    command = grammar.parse("wave on plug switch in living room")
+    assert targets(command) == ["plug"]
+    assert command.action == "on"
+
+
+def test_parse_is_case_and_space_insensitive(grammar):
+    command = grammar.parse("  Wave OFF   Lamp in KITCHEN ")
+    assert targets(command) == ["lamp"]
+    assert command.action == "off"
+
+
+def test_parse_trimmed_off(grammar):
+    assert grammar.parse("wave of lamp in kitchen").action == "off"
+
+
+def test_parse_unknown_slots(grammar):
+    assert grammar.parse("wave on plug switch in kitchen") is None
+    assert grammar.parse("wave on toaster in kitchen") is None
+    assert grammar.parse("blink on lamp in kitchen") is None
+
+
+def test_parse_action_not_supported_by_type(grammar):
+    assert grammar.parse("wave lock lamp in kitchen") is None
+    assert grammar.parse("wave lock back door in kitchen").action == "close"
+
+
+def test_parse_groups(grammar):
+    assert targets(grammar.parse("wave off everything")) == ["dimmer", "lamp", "plug"]
+    assert targets(grammar.parse("wave off everything in kitchen")) == ["lamp"]
+    assert targets(grammar.parse("wave off all the switches")) == ["lamp", "plug"]
+    assert targets(grammar.parse("wave lock all locks")) == ["door"]
+
+
+def test_remove_device(grammar):
+    assert grammar.remove_device("lamp")
+    assert grammar.parse("wave on lamp in kitchen") is None
+    assert not grammar.remove_device("lamp")
+
+
+def test_copy_is_independent(grammar):
+    copy = grammar.copy()
+    copy.remove_device("plug")
+    assert copy.parse("wave on plug switch in living room") is None
+    assert grammar.parse("wave on plug switch in living room") is not None
+
+
+def test_commands_enumeration(grammar):
+    commands = set(grammar.commands())
+    assert "wave on plug switch in living room" in commands
+    assert "wave lock back door in kitchen" in commands
+    assert "wave lock lamp in kitchen" not in commands
+
+
+def test_homonyms_are_told_apart(grammar):
+    grammar.add_device("Kitchen", device("lamp2", "Lamp"), 2)
+    assert targets(grammar.parse("wave on lamp in kitchen")) == ["lamp"]
+    assert targets(grammar.parse("wave on lamp 2 in kitchen")) == ["lamp2"]
+    assert "wave on lamp 2 in kitchen" in set(grammar.commands())
+
+
+def test_homonyms_removal_in_any_order(grammar):
+    grammar.add_device("Kitchen", device("lamp2", "Lamp"), 2)
+    assert grammar.remove_device("lamp")
+    assert targets(grammar.parse("wave on lamp 2 in kitchen")) == ["lamp2"]
+    assert grammar.remove_device("lamp2")
+    assert grammar.parse("wave on lamp 2 in kitchen") is None
+    assert targets(grammar.parse("wave lock everything in kitchen")) == ["door"]
+
+
+def test_complete_names_starting_with_the_article(grammar):
+    grammar.add_device("The Attic", device("fan", "The Fan"), 3)
+    assert [candidate.id for candidate in grammar.complete("wave on the fan ")] == ["fan"]
+    assert [candidate.id for candidate in grammar.complete("wave on fan in the att")] == ["fan"]
+    assert [candidate.id for candidate in grammar.complete("wave on the pl")] == ["plug"]
@@ -0,0 +1,56 @@
+# Copyright 2017 Pierre-yves Baloche
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" Tests of the level commands and of the spoken numbers """
+import pytest
+
+from conftest import device, targets
+from zwaveme_assist.helper import ZwaveMeHelper
+
+
+@pytest.mark.parametrize("text, value", [
+    ("40", 40), ("40.0", 40), ("40.5", 40.5), (" 7 ", 7), ("zero", 0), ("nineteen", 19), ("forty", 40),
+    ("forty-five", 45), ("forty five", 45), ("a hundred", 100), ("one hundred", 100), ("two hundred and five", 205)])
+def test_spoken_number(text, value):
+    assert ZwaveMeHelper.SpokenNumber.parse(text) == value
+
+
+@pytest.mark.parametrize("text", ["", "nan", "inf", "-inf", "lamp", "forty forty", "five forty", "hundred",
+                                  "twelve five"])
+def test_spoken_number_rejected(text):
+    assert ZwaveMeHelper.SpokenNumber.parse(text) is None
+
+
+@pytest.fixture
+def grammar(grammar):
+    grammar.add_device("Living Room", device("dimmer", "Ceiling", "switchMultilevel"), 1)
+    grammar.add_device("Living Room", device("plug", "Plug Switch"), 1)
+    return grammar
+
+
+@pytest.mark.parametrize("order, level", [
+    ("wave set ceiling to 40 in living room", 40),
+    ("wave set ceiling to 40 percent in living room", 40),
+    ("wave set ceiling in living room to forty-five", 45),
+    ("wave set ceiling to 150 % in living room", 99),
+    ("wave set all the dimmers to a hundred", 99)])
+def test_level_command(grammar, order, level):
+    command = grammar.parse(order)
+    assert targets(command) == ["dimmer"]
+    assert command.action == ZwaveMeHelper.APIDeviceActionStrategy.level_action(level)
+
+
+def test_level_command_rejected(grammar):
+    assert grammar.parse("wave set plug switch to 40 in living room") is None
+    assert grammar.parse("wave set ceiling to nan in living room") is None
+    assert grammar.parse("wave set ceiling in living room") is None
@@ -0,0 +1,98 @@
+# Copyright 2017 Pierre-yves Baloche
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" Tests of the phonetic matching of the slots """
+import pytest
+
+from conftest import device, targets
+from zwaveme_assist.helper import ZwaveMeHelper
+
+THRESHOLD = ZwaveMeHelper.FUZZY_THRESHOLD
+
+
+@pytest.mark.parametrize("heard, name", [
+    ("plugs which", "plug switch"), ("launch", "lounge"), ("leaving room", "living room"), ("kitchin", "kitchen"),
+    ("bed room", "bedroom"), ("Plug Switch", "plug switch")])
+def test_misheard_names_share_the_code(heard, name):
+    assert ZwaveMeHelper.PhoneticKey.encode(heard) == ZwaveMeHelper.PhoneticKey.encode(name)
+
+
+@pytest.mark.parametrize("first, second", [
+    ("room 1", "room 2"), ("lamp", "lamb"), ("kitchen", "chicken"), ("bedroom", "bathroom"), ("bath 0", "bat 0")])
+def test_different_names_differ(first, second):
+    assert ZwaveMeHelper.PhoneticKey.encode(first) != ZwaveMeHelper.PhoneticKey.encode(second)
+
+
+@pytest.fixture
+def grammar(grammar):
+    grammar.add_device("Lounge", device("plug", "Plug Switch"), 1)
+    grammar.add_device("Kitchen", device("lamp", "Lamp"), 2)
+    grammar.add_device("Kitchen", device("lam", "Lam"), 2)
+    grammar.add_device("Kitchen", device("lamb", "Lamb"), 2)
+    grammar.add_device("Bathroom", device("light", "Light"), 3)
+    return grammar
+
+
+def resolved(grammar, order):
+    candidates = grammar.resolve(order, THRESHOLD)
+    return targets(candidates[0][0]) if candidates else None
+
+
+def test_sounding_slots_are_not_exact(grammar):
+    assert grammar.parse("wave on plugs which in launch") is None
+    assert grammar.parse("wave on plug switch in launch") is None
+    assert targets(grammar.parse("wave on plug switch in lounge")) == ["plug"]
+
+
+def test_resolve_sounding_slots(grammar):
+    assert resolved(grammar, "wave on plugs which in launch") == ["plug"]
+    assert resolved(grammar, "wave on plug switch in launch") == ["plug"]
+    assert resolved(grammar, "wave on plugs which in lounge") == ["plug"]
+    assert resolved(grammar, "wave off the plugs which in the launch") == ["plug"]
+
+
+def test_sounding_slot_confidence(grammar):
+    (_, alike), = grammar.resolve("wave on plugs which in lounge", THRESHOLD)
+    (_, closer), = grammar.resolve("wave on plug switch in launch", THRESHOLD)
+    assert THRESHOLD <= closer < alike == 1.0
+    (_, further), = grammar.resolve("wave on lid in bathroom", 0.0)
+    assert further < alike
+    assert grammar.resolve("wave on lid in bathroom", (1.0 + further) / 2.0) == []
+
+
+def test_resolve_exact_name_first(grammar):
+    command, score, index = grammar.resolve_many(["wave on lamm in kitchen", "wave on lamb in kitchen"],
+                                                 THRESHOLD, 1)[0]
+    assert (targets(command), score, index) == (["lamb"], 1.0, 1)
+
+
+def test_ambiguous_sound(grammar):
+    assert grammar.parse_query("wave is lamm on in kitchen", THRESHOLD) is None
+    grammar.remove_device("lam")
+    device, _ = grammar.parse_query("wave is lamm on in kitchen", THRESHOLD)
+    assert device.id == "lamb"
+
+
+def test_bedroom_is_not_the_bathroom(grammar):
+    assert grammar.resolve("wave on light in bedroom", THRESHOLD) == []
+
+
+def test_sounding_device_needs_its_room(grammar):
+    assert grammar.resolve("wave on plugs which in kitchen", THRESHOLD) == []
+
+
+def test_query_sounding_slots(grammar):
+    assert grammar.parse_query("wave is plugs which on in launch") is None
+    device, state = grammar.parse_query("wave is plugs which on in launch", THRESHOLD)
+    assert (device.id, state) == ("plug", "on")
+    assert grammar.parse_query("wave is light on in bedroom", THRESHOLD) is None
@@ -0,0 +1,41 @@
+# Copyright 2017 Pierre-yves Baloche
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" Tests of the background refresh of the command grammar """
+import time
+
+
+def test_refresh_swaps_grammar(helper):
+    commands = helper._commands
+    assert helper.refresh_commands()
+    assert helper._commands is not commands
+    assert helper.commands_age < 1.0
+
+
+def test_failed_refresh_keeps_grammar_and_backs_off(helper, stub):
+    commands = helper._commands
+    stub.error_rate = 1.0
+    attempts = []
+    sync = helper._sync_commands
+
+    def counted_sync():
+        attempts.append(time.monotonic())
+        return sync()
+
+    helper._sync_commands = counted_sync
+    helper.start_refresh(0.2)
+    time.sleep(1.5)
+    helper.stop_refresh()
+    assert helper._commands is commands
+    # Without backing off, the loop would spin on the failing controller
+    assert 1 <= len(attempts) <= 8
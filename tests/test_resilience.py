@@ -0,0 +1,136 @@
+# Copyright 2017 Pierre-yves Baloche
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" Tests of the circuit breaker, the retry budget and the retries """
+import time
+
+import pytest
+import requests
+
+from zwaveme_assist.helper import ZwaveMeHelper
+
+
+def test_breaker_opens_past_the_threshold():
+    breaker = ZwaveMeHelper.CircuitBreaker("controller")
+    for _ in range(breaker.FAILURE_THRESHOLD - 1):
+        assert breaker.allow()
+        breaker.failure()
+    assert not breaker.is_open
+    breaker.success()
+    for _ in range(breaker.FAILURE_THRESHOLD):
+        breaker.failure()
+    assert breaker.is_open and not breaker.allow()
+
+
+def test_breaker_lets_a_single_trial_through(monkeypatch):
+    monkeypatch.setattr(ZwaveMeHelper.CircuitBreaker, "RESET_TIMEOUT", 0.05)
+    breaker = ZwaveMeHelper.CircuitBreaker("controller")
+    for _ in range(breaker.FAILURE_THRESHOLD):
+        breaker.failure()
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.failure()
+    assert not breaker.allow()
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.cancel()
+    assert breaker.allow()
+    breaker.success()
+    assert not breaker.is_open and breaker.allow() and breaker.allow()
+
+
+def test_retry_budget():
+    budget = ZwaveMeHelper.RetryBudget()
+    assert all(budget.withdraw() for _ in range(int(budget.CAPACITY)))
+    assert not budget.withdraw()
+    for _ in range(int(1 / budget.RATIO)):
+        budget.deposit()
+    assert budget.withdraw()
+    assert not budget.withdraw()
+
+
+@pytest.fixture
+def strategy(stub, credentials_dict):
+    credentials_dict[ZwaveMeHelper.ZAUTO_SESSION_AUTH] = False
+    ZwaveMeHelper.AbstractAPIStrategy._retry_budget = None
+    yield ZwaveMeHelper.APIDeviceActionStrategy(credentials_dict)
+    ZwaveMeHelper.AbstractAPIStrategy._retry_budget = None
+
+
+@pytest.fixture
+def device(stub):
+    return ZwaveMeHelper.ZAutomationDevice(stub.devices[0])
+
+
+def test_unexpected_failure_ends_the_trial(strategy, device, monkeypatch):
+    breaker = strategy.breaker
+    breaker.RESET_TIMEOUT = 0.0
+    for _ in range(breaker.FAILURE_THRESHOLD):
+        breaker.failure()
+
+    def garbled(*args, **kwargs):
+        raise KeyError("sid")
+    monkeypatch.setattr(strategy, "_send", garbled)
+    with pytest.raises(KeyError):
+        strategy.apply([device, "on"])
+    monkeypatch.undo()
+    assert breaker.is_open and breaker.allow()
+
+
+def test_server_errors_are_retried_for_idempotent_actions_only(stub, strategy, device):
+    stub.error_rate = 1.0
+    sent = stub.requests
+    with pytest.raises(requests.HTTPError):
+        strategy.apply([device, "on"])
+    assert stub.requests - sent == strategy.retries + 1
+    sent = stub.requests
+    with pytest.raises(requests.HTTPError):
+        strategy.apply([device, "up"])
+    assert stub.requests - sent == 1
+
+
+def test_unsent_requests_are_retried_for_any_action(strategy, device, monkeypatch):
+    # Nothing listens on that port, the connection is refused
+    monkeypatch.setitem(strategy._credentials, ZwaveMeHelper.ZAUTO_URL, "http://127.0.0.1:1")
+    monkeypatch.setattr(strategy, "backoff", lambda attempt: 0.0)
+    attempts = []
+    send = strategy._send
+
+    def counted(*args, **kwargs):
+        attempts.append(args)
+        return send(*args, **kwargs)
+    monkeypatch.setattr(strategy, "_send", counted)
+    with pytest.raises(requests.ConnectionError):
+        strategy.apply([device, "up"])
+    assert len(attempts) == strategy.retries + 1
+
+
+def test_failed_login_counts_against_the_controller(stub, credentials_dict, device):
+    strategy = ZwaveMeHelper.APIDeviceActionStrategy(credentials_dict)
+    stub.error_rate = 1.0
+    with pytest.raises(requests.HTTPError):
+        strategy.apply([device, "on"])
+    assert strategy.breaker._failures == 1
+    stub.error_rate = 0.0
+    assert strategy.apply([device, "on"])
+    assert strategy.breaker._failures == 0
+
+
+def test_login_within_the_deadline(stub, credentials_dict):
+    strategy = ZwaveMeHelper.APIListLocationStrategy(credentials_dict)
+    stub.latency = 0.5
+    start = time.monotonic()
+    with pytest.raises(requests.Timeout):
+        strategy.apply(ZwaveMeHelper.Deadline(0.2))
+    assert time.monotonic() - start < 0.45
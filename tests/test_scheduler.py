@@ -0,0 +1,101 @@
+# Copyright 2017 Pierre-yves Baloche
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" Tests of the airtime scheduler of the commands """
+import concurrent.futures as futures
+import threading
+import time
+
+import pytest
+import requests
+
+from conftest import device
+from zwaveme_assist.helper import ZwaveMeHelper
+
+
+def node(number, instance=0):
+    return device("ZWayVDev_zway_{!s}-{!s}-37".format(number, instance), "Switch")
+
+
+def test_node_of():
+    assert ZwaveMeHelper.AirtimeScheduler.node_of(node(12)) == 12
+    assert ZwaveMeHelper.AirtimeScheduler.node_of(device("DummyDevice_1", "Virtual")) is None
+
+
+def test_interleave_spreads_the_nodes():
+    devices = [node(2, 0), node(2, 1), node(2, 2), node(3, 0), node(3, 1), node(4, 0)]
+    ordered = ZwaveMeHelper.AirtimeScheduler.interleave(devices)
+    assert list(target.api_id for target in ordered) == list(devices[index].api_id for index in (0, 3, 5, 1, 4, 2))
+
+
+def test_burst_then_rate():
+    scheduler = ZwaveMeHelper.AirtimeScheduler(rate=20.0, burst=3, max_in_flight=10)
+    start = time.monotonic()
+    for _ in range(3):
+        with scheduler.slot(node(2)):
+            pass
+    assert time.monotonic() - start < 0.05
+    for _ in range(2):
+        with scheduler.slot(node(2)):
+            pass
+    assert 0.08 < time.monotonic() - start < 0.2
+
+
+def test_virtual_devices_are_not_paced():
+    scheduler = ZwaveMeHelper.AirtimeScheduler(rate=1.0, burst=1, max_in_flight=1)
+    start = time.monotonic()
+    for _ in range(5):
+        with scheduler.slot(device("DummyDevice_1", "Virtual")):
+            pass
+    assert time.monotonic() - start < 0.05
+
+
+def test_in_flight_limit():
+    scheduler = ZwaveMeHelper.AirtimeScheduler(rate=1000.0, burst=100, max_in_flight=2)
+    lock = threading.Lock()
+    in_flight = [0, 0]
+
+    def command(number):
+        with scheduler.slot(node(number)):
+            with lock:
+                in_flight[0] += 1
+                in_flight[1] = max(in_flight)
+            time.sleep(0.05)
+            with lock:
+                in_flight[0] -= 1
+    with futures.ThreadPoolExecutor(max_workers=6) as executor:
+        list(executor.map(command, range(2, 8)))
+    assert in_flight == [0, 2]
+
+
+def test_refused_past_the_deadline():
+    scheduler = ZwaveMeHelper.AirtimeScheduler(rate=1.0, burst=1, max_in_flight=10)
+    with scheduler.slot(node(2)):
+        pass
+    start = time.monotonic()
+    with pytest.raises(requests.Timeout):
+        with scheduler.slot(node(2), ZwaveMeHelper.Deadline(0.5)):
+            pass
+    assert time.monotonic() - start < 0.05
+    # The refused command gave its token back
+    assert scheduler._reserve() == pytest.approx(1.0, abs=0.05)
+
+
+def test_in_flight_wait_bounded_by_the_deadline():
+    scheduler = ZwaveMeHelper.AirtimeScheduler(rate=1000.0, burst=100, max_in_flight=1)
+    with scheduler.slot(node(2)):
+        start = time.monotonic()
+        with pytest.raises(ZwaveMeHelper.DeadlineExceeded):
+            with scheduler.slot(node(3), ZwaveMeHelper.Deadline(0.1)):
+                pass
+        assert 0.08 < time.monotonic() - start < 0.3
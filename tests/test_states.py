@@ -0,0 +1,92 @@
+# Copyright 2017 Pierre-yves Baloche
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" Tests of the shadow of the devices' states """
+import concurrent.futures as futures
+import threading
+import time
+
+import pytest
+import requests
+
+from conftest import device
+from zwaveme_assist.helper import ZwaveMeHelper
+
+
+def test_inventory_seeds_the_shadow(stub, helper):
+    assert len(helper.states) == len(stub.devices)
+    sent = stub.requests
+    result = helper.do_vocal_commands("wave off switch 2 in room 1")
+    assert result and stub.requests == sent
+    assert helper.do_vocal_commands("wave on switch 2 in room 1")
+    assert stub.requests == sent + 1
+
+
+def test_level_expires():
+    shadow = ZwaveMeHelper.StateShadow(10.0)
+    shadow.update("plug", "on", at=time.monotonic() - 20.0)
+    assert shadow.get("plug") is None
+    assert shadow.get("plug", max_age=30.0) == "on"
+    shadow.update("plug", None)
+    assert len(shadow) == 0
+
+
+def test_fetch_uses_the_known_level():
+    shadow = ZwaveMeHelper.StateShadow(10.0)
+    shadow.update("plug", "on")
+    assert shadow.fetch(device("plug", "Plug"), lambda target: pytest.fail("requested")) == "on"
+
+
+def test_fetch_coalesces_concurrent_requests():
+    shadow = ZwaveMeHelper.StateShadow(10.0)
+    sensor = device("sensor", "Sensor", "sensorMultilevel")
+    release = threading.Event()
+    calls = []
+
+    def loader(target):
+        calls.append(target)
+        release.wait(5.0)
+        return 21.5
+    with futures.ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.submit(shadow.fetch, sensor, loader) for _ in range(4))
+        time.sleep(0.1)
+        release.set()
+        assert list(result.result() for result in results) == [21.5] * 4
+    assert len(calls) == 1
+    assert shadow.get("sensor") == 21.5
+
+
+def test_fetch_propagates_the_failure_to_every_caller():
+    shadow = ZwaveMeHelper.StateShadow(10.0)
+    sensor = device("sensor", "Sensor", "sensorMultilevel")
+    release = threading.Event()
+
+    def loader(target):
+        release.wait(5.0)
+        raise requests.Timeout("no answer")
+    with futures.ThreadPoolExecutor(max_workers=3) as executor:
+        results = list(executor.submit(shadow.fetch, sensor, loader) for _ in range(3))
+        time.sleep(0.1)
+        release.set()
+        for result in results:
+            with pytest.raises(requests.Timeout):
+                result.result()
+    # The failed flight is over, the next call requests again
+    assert shadow.fetch(sensor, lambda target: 20.0) == 20.0
+
+
+def test_query_answered_from_the_shadow(stub, helper):
+    sent = stub.requests
+    result = helper.do_vocal_query("wave is switch 2 on in room 1")
+    assert result.device.name == "Switch 2" and result.value == "off" and not result
+    assert stub.requests == sent
@@ -0,0 +1,53 @@
+# Copyright 2017 Pierre-yves Baloche
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" Tests of the streamed /locations response """
+import json
+
+import pytest
+
+from zwaveme_assist.helper import ZwaveMeHelper
+
+ENVELOPE = {"message": "200 OK", "data": [{"id": 1, "title": "Kitchen é"}, {"id": 2, "title": "Hall"}],
+            "code": 200, "error": None}
+
+
+def chunked(payload, size):
+    body = json.dumps(payload, ensure_ascii=False).encode("utf8")
+    return list(body[start:start + size] for start in range(0, len(body), size))
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 4096])
+def test_stream_yields_data_items_whatever_the_chunks(size):
+    assert list(ZwaveMeHelper.JSONEnvelopeStream(chunked(ENVELOPE, size))) == ENVELOPE["data"]
+
+
+def test_stream_empty_data():
+    assert list(ZwaveMeHelper.JSONEnvelopeStream(chunked({"data": [], "code": 200}, 5))) == []
+    assert list(ZwaveMeHelper.JSONEnvelopeStream(chunked({}, 5))) == []
+
+
+def test_stream_truncated_body():
+    chunks = chunked(ENVELOPE, 8)[:-3]
+    with pytest.raises(ValueError):
+        list(ZwaveMeHelper.JSONEnvelopeStream(chunks))
+
+
+def test_streamed_locations_match_buffered_ones(credentials_dict):
+    buffered = ZwaveMeHelper.APIListLocationStrategy(credentials_dict).apply()
+    streamed = list(ZwaveMeHelper.APIListLocationStrategy(credentials_dict, stream=True).apply())
+    assert [(location.id, location.title) for location in streamed] == \
+        [(location.id, location.title) for location in buffered]
+    assert [sorted(device.id for devices in location.devices.values() for device in devices)
+            for location in streamed] == \
+        [sorted(device.id for devices in location.devices.values() for device in devices) for location in buffered]
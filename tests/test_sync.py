@@ -0,0 +1,43 @@
+# Copyright 2017 Pierre-yves Baloche
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" Tests of the incremental synchronisation of the command grammar """
+import time
+
+
+def rename(stub, room_id, name):
+    devices = list(device for device in stub.devices if device["location"] == room_id)
+    for device in devices:
+        device["metrics"]["title"] = name
+        device["updateTime"] = int(time.time())
+    return devices
+
+
+def test_sync_patches_renamed_device(helper, stub):
+    device = rename(stub, 1, "Heater")[0]
+    for other in stub.devices[1:]:
+        other["updateTime"] = 0
+    helper._update_time = int(time.time()) - 1
+    assert helper._sync_commands()
+    command = helper._lookup_command("wave on heater in room 1")
+    assert [target.id for target in command.devices] == [device["id"]]
+
+
+def test_sync_homonyms_twice(helper, stub):
+    devices = rename(stub, 1, "Temperature")
+    for _ in range(2):
+        helper._update_time = int(time.time()) - 1
+        assert helper._sync_commands()
+        found = set(helper._lookup_command(order).devices[0].id for order in (
+            "wave on temperature in room 1", "wave on temperature 2 in room 1", "wave on temperature 3 in room 1"))
+        assert found == set(device["id"] for device in devices)
@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+# Copyright 2017 Pierre-yves Baloche
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" Benchmarks of the helper against the local ZAutomation stand-in """
+import argparse
+import itertools
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from zwaveme_assist.helper import ZwaveMeHelper
+from zwaveme_assist.stub_server import ZAutomationStubServer
+
+
+class Benchmark(object):
+    """ Benchmark suite, each measure being reported in milliseconds """
+
+    def __init__(self, stub, iterations=100):
+        """
+        Constructor.
+        :param stub: The running stand-in server
+        :type stub: ZAutomationStubServer
+        :param iterations: The number of runs of each measure
+        """
+        self._stub = stub
+        self._iterations = iterations
+        self._credentials = os.path.join(tempfile.mkdtemp(), "zaut_credentials.json")
+        credentials = stub.credentials()
+        # The stand-in has no radio to spare, the commands are not paced not to measure the pacing itself
+        credentials[ZwaveMeHelper.ZAUTO_COMMAND_RATE] = 1e6
+        with open(self._credentials, 'w') as credential_file:
+            json.dump(credentials, credential_file)
+
+    def helper(self):
+        """
+        Create a helper towards the stand-in server, without cache.
+        :return: ZwaveMeHelper
+        """
+        return ZwaveMeHelper(self._credentials, cache_file_path=None)
+
+    @staticmethod
+    def statistics(durations):
+        """
+        Summarize a series of durations.
+        :param durations: The durations, in seconds
+        :return: dict
+        """
+        ordered = sorted(duration * 1000.0 for duration in durations)
+        return {
+            "runs": len(ordered),
+            "mean_ms": statistics.mean(ordered),
+            "median_ms": statistics.median(ordered),
+            "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+            "min_ms": ordered[0],
+            "max_ms": ordered[-1]
+        }
+
+    def _measure(self, operation, iterations=None):
+        durations = []
+        for _ in range(iterations or self._iterations):
+            start = time.perf_counter()
+            operation()
+            durations.append(time.perf_counter() - start)
+        return self.statistics(durations)
+
+    def _orders(self, helper):
+        commands = list(helper.get_vocal_commands())
+        device_commands = list(command for command in commands if " switch " in command)
+        return device_commands[0], device_commands[-1]
+
+    def build(self):
+        """Time to fetch the locations and build the command grammar"""
+        return self._measure(lambda: self.helper().get_vocal_commands(), max(1, self._iterations // 10))
+
+    def resolve(self):
+        """Time to resolve an exact order and a misheard one, without performing them"""
+        helper = self.helper()
+        first, last = self._orders(helper)
+        misheard = last.replace("switch", "switches")
+        return {
+            "exact": self._measure(lambda: helper._lookup_command(first)),
+            "fuzzy": self._measure(lambda: helper._lookup_command(misheard))
+        }
+
+    def round_trip(self):
+        """Time to perform a single device order, then a house-wide one, toggling not to be skipped as redundant"""
+        helper = self.helper()
+        first, _ = self._orders(helper)
+        device_orders = itertools.cycle((first, first.replace(" on ", " off ", 1)))
+        house_orders = itertools.cycle(("wave on everything", "wave off everything"))
+        return {
+            "device": self._measure(lambda: helper.do_vocal_commands(next(device_orders))),
+            "house": self._measure(lambda: helper.do_vocal_commands(next(house_orders)),
+                                   max(1, self._iterations // 10)),
+            "redundant": self._measure(lambda: helper.do_vocal_commands(first))
+        }
+
+    def memory(self):
+        """Memory allocated to build the command grammar and its fuzzy indexes"""
+        tracemalloc.start()
+        helper = self.helper()
+        helper.get_vocal_commands()
+        helper._lookup_command("wave on nothing in nowhere")
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return {"retained_kib": current / 1024.0, "peak_kib": peak / 1024.0}
+
+    def run(self):
+        """
+        Run the whole suite.
+        :return: dict
+        """
+        return {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "server": {"devices": len(self._stub.devices), "latency_s": self._stub.latency,
+                       "error_rate": self._stub.error_rate},
+            "build": self.build(),
+            "resolve": self.resolve(),
+            "round_trip": self.round_trip(),
+            "memory": self.memory()
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rooms", type=int, default=10)
+    parser.add_argument("--devices", type=int, default=10, help="devices per room")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--output", help="JSON report path, standard output by default")
+    args = parser.parse_args()
+    # The resolution measures include unknown orders on purpose
+    logging.disable(logging.ERROR)
+    with ZAutomationStubServer(args.rooms, args.devices, args.latency, args.error_rate, seed=0) as stub:
+        report = Benchmark(stub, args.iterations).run()
+    ZwaveMeHelper.AbstractAPIStrategy.close_sessions()
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+
+if __name__ == '__main__':
+    main()
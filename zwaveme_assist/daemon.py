@@ -0,0 +1,316 @@
+#!/usr/bin/env python
+# Copyright 2017 Pierre-yves Baloche
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" Long-running helper serving the vocal orders over a Unix domain socket """
+import argparse
+import json
+import logging
+import os
+import socket
+import socketserver
+import struct
+import sys
+import threading
+
+from zwaveme_assist.helper import ZwaveMeHelper
+
+
+class Frames(object):
+    """
+    Framing of the messages exchanged over the socket: a big-endian 32 bits length, then the UTF-8 JSON message.
+    """
+
+    _HEADER = struct.Struct(">I")
+    # Bigger messages are refused, not to allocate whatever a broken client announces
+    MAX_SIZE = 1 << 20
+
+    @classmethod
+    def write(cls, stream, message):
+        """
+        Write a message.
+        :param stream: The binary stream
+        :param message: The JSON serializable message
+        """
+        body = json.dumps(message, separators=(",", ":")).encode("utf8")
+        stream.write(cls._HEADER.pack(len(body)) + body)
+        stream.flush()
+
+    @classmethod
+    def read(cls, stream):
+        """
+        Read a message.
+        :param stream: The binary stream
+        :return: The message, None once the stream is closed
+        """
+        header = stream.read(cls._HEADER.size)
+        if len(header) < cls._HEADER.size:
+            return None
+        size, = cls._HEADER.unpack(header)
+        if size > cls.MAX_SIZE:
+            raise ValueError("Message of {!s} bytes refused".format(size))
+        body = stream.read(size)
+        if len(body) < size:
+            return None
+        return json.loads(body.decode("utf8"))
+
+
+class ZwaveMeDaemon(object):
+    """
+    Keep a helper, its connection pool and its command grammar warm, and serve it over a Unix domain socket.
+    Each request is a [method, order] message answered by a {"ok": bool, "result": ...} one, any number of them
+    being exchanged over a connection. The order being transcribed is tracked per connection.
+    """
+
+    DEFAULT_SOCKET = "~/.zaut_assist.sock"
+
+    def __init__(self, helper, socket_path=DEFAULT_SOCKET, refresh_ttl=ZwaveMeHelper.COMMANDS_TTL):
+        """
+        Constructor.
+        :param helper: The helper to serve
+        :type helper: ZwaveMeHelper
+        :param socket_path: The path of the socket
+        :param refresh_ttl: The commands time to live (in seconds), None not to refresh them in the background
+        """
+        self._logger = logging.getLogger(self.__class__.__name__)
+        self.helper = helper
+        self.socket_path = os.path.expanduser(socket_path)
+        self._refresh_ttl = refresh_ttl
+        self._server = None
+        # {method name: callable(order, connection) returning a JSON serializable result}
+        self._methods = {
+            "commands": lambda order, connection: list(self.helper.get_vocal_commands()),
+            "command": self._command,
+            "partial": self._partial_order,
+            "query": lambda order, connection: self._query(order)
+        }
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _partial_order(self, order, connection):
+        if connection.partial is None:
+            connection.partial = self.helper.partial_order()
+        candidates = connection.partial.feed(order)
+        return None if candidates is None else list(device.name for device in candidates)
+
+    def _command(self, order, connection):
+        connection.partial = None
+        if isinstance(order, list):
+            result = self.helper.resolve_many(order)
+        else:
+            result = self.helper.do_vocal_commands(order)
+        return {"order": result.order, "done": bool(result), "devices": len(result.results),
+                "failures": result.failures, "remaining": result.remaining}
+
+    def _query(self, order):
+        result = self.helper.do_vocal_query(order)
+        return {"answer": result.answer, "value": result.value,
+                "device": None if result.device is None else result.device.name}
+
+    def handle(self, request, connection=None):
+        """
+        Answer a request.
+        :param request: The [method, order] message
+        :param connection: The state of the connection the request came from, None for a request on its own
+        :type connection: ZwaveMeDaemon.Connection
+        :return: dict, the answer message
+        """
+        if connection is None:
+            connection = self.Connection()
+        try:
+            method, order = request
+            method = self._methods[method]
+        except (KeyError, TypeError, ValueError) as error:
+            self._logger.log(logging.ERROR, "Invalid request {!s}: {!s}".format(request, error))
+            return {"ok": False, "result": "Invalid request"}
+        try:
+            result = method(order, connection)
+        except Exception as error:
+            # The helper failing on an order must not drop the connection, nor pass for the client's mistake
+            self._logger.exception("Request {!s} failed".format(request))
+            return {"ok": False, "result": "{!s}: {!s}".format(error.__class__.__name__, error)}
+        return {"ok": True, "result": result}
+
+    def start(self):
+        """Warm the helper up, then serve in a background thread"""
+        self.helper.get_vocal_commands()
+        if self._refresh_ttl is not None:
+            self.helper.start_refresh(self._refresh_ttl)
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self._server = self._Server(self.socket_path, self._Handler)
+        self._server.daemon = self
+        threading.Thread(target=self._server.serve_forever, name="zaut-daemon", daemon=True).start()
+        self._logger.log(logging.INFO, "Serving on {!s}".format(self.socket_path))
+
+    def serve_forever(self):
+        """Warm the helper up, then serve until interrupted"""
+        self.start()
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            self.stop()
+
+    def stop(self):
+        """Stop serving"""
+        self.helper.stop_refresh()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+            os.unlink(self.socket_path)
+        ZwaveMeHelper.AbstractAPIStrategy.close_sessions()
+
+    class Connection(object):
+        """
+        State of a client's connection.
+        """
+
+        def __init__(self):
+            # Order being transcribed, fed by the partial transcriptions until it is performed
+            self.partial = None
+
+    class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+    class _Handler(socketserver.StreamRequestHandler):
+
+        def setup(self):
+            super().setup()
+            self.state = ZwaveMeDaemon.Connection()
+
+        def handle(self):
+            while True:
+                try:
+                    request = Frames.read(self.rfile)
+                except ValueError as error:
+                    Frames.write(self.wfile, {"ok": False, "result": "{!s}".format(error)})
+                    return
+                if request is None:
+                    return
+                Frames.write(self.wfile, self.server.daemon.handle(request, self.state))
+
+
+class ZwaveMeClient(object):
+    """
+    Thin client of the daemon, keeping its connection open between the orders.
+    """
+
+    def __init__(self, socket_path=ZwaveMeDaemon.DEFAULT_SOCKET, timeout=10.0):
+        """
+        Constructor.
+        :param socket_path: The path of the daemon's socket
+        :param timeout: The delay (in seconds) to wait for an answer
+        """
+        self.socket_path = os.path.expanduser(socket_path)
+        self._timeout = timeout
+        self._socket = None
+        self._stream = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Close the connection"""
+        if self._socket is not None:
+            self._stream.close()
+            self._socket.close()
+            self._socket = None
+            self._stream = None
+
+    def _call(self, method, order=None):
+        """
+        Send a request, reconnecting once if the daemon closed the connection meanwhile.
+        Any other failure, a timeout included, closes the connection: a late answer must not be read by the next call.
+        :param method: The daemon's method
+        :param order: The vocal order
+        :return: The request's result
+        """
+        for attempt in range(2):
+            try:
+                if self._socket is None:
+                    self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                    self._stream = self._socket.makefile("rwb")
+                    self._socket.settimeout(self._timeout)
+                    self._socket.connect(self.socket_path)
+                Frames.write(self._stream, [method, order])
+                answer = Frames.read(self._stream)
+            except (BrokenPipeError, ConnectionResetError):
+                answer = None
+            except (OSError, ValueError):
+                self.close()
+                raise
+            if answer is not None:
+                if not answer["ok"]:
+                    raise ValueError(answer["result"])
+                return answer["result"]
+            self.close()
+        raise ConnectionError("Daemon unavailable on {!s}".format(self.socket_path))
+
+    def get_vocal_commands(self):
+        """
+        Provide the list of supported vocal commands.
+        :return: list of string
+        """
+        return self._call("commands")
+
+    def do_vocal_commands(self, order):
+        """
+        Perform the requested command.
+        :param order: The vocal order, or the list of its transcription hypotheses, most likely first
+        :return: dict, with the performed order, whether every targeted device performed it and the failing ones
+        """
+        return self._call("command", order)
+
+    def feed_partial(self, partial):
+        """
+        Send a partial transcription of the coming order, for the daemon to warm up the connection to the controller.
+        :return: list of the candidate devices' names, None until the base order and an action are heard
+        """
+        return self._call("partial", partial)
+
+    def do_vocal_query(self, order):
+        """
+        Answer a question about a device's state.
+        :return: dict, with the answer and the device's level
+        """
+        return self._call("query", order)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--socket", default=ZwaveMeDaemon.DEFAULT_SOCKET)
+    parser.add_argument("--credentials", default=ZwaveMeHelper.DEFAULT_ZAUTOMATION_CREDENTIALS)
+    parser.add_argument("--cache", default=ZwaveMeHelper.DEFAULT_COMMANDS_CACHE)
+    parser.add_argument("--order", help="send this order to the running daemon instead of serving")
+    parser.add_argument("--query", help="send this question to the running daemon instead of serving")
+    args = parser.parse_args()
+    if args.order or args.query:
+        with ZwaveMeClient(args.socket) as client:
+            result = client.do_vocal_commands(args.order) if args.order else client.do_vocal_query(args.query)
+        json.dump(result, sys.stdout)
+        sys.stdout.write("\n")
+        return
+    logging.basicConfig(level=logging.INFO)
+    ZwaveMeDaemon(ZwaveMeHelper(args.credentials, args.cache), args.socket).serve_forever()
+
+if __name__ == '__main__':
+    main()
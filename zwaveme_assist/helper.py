@@ -14,12 +14,29 @@
 # limitations under the License.
 """ Helper class for ZAutomation API """
 import abc
+import asyncio
+import bisect
+import codecs
+import collections
+import contextlib
+import copy
+import concurrent.futures as futures
+import functools
 import io
 import logging
 import os
 import json
+import random
+import zlib
+import re
+import struct
+import threading
+import time
+import urllib.parse
 import requests
+import requests.adapters as adapters
 import requests.auth as auth
+import requests.packages.urllib3.exceptions as urllib3_exceptions
 
 
 class ZwaveMeHelper(object):
@@ -34,17 +51,38 @@ class ZwaveMeHelper(object):
 
     # noinspection SpellCheckingInspection
     DEFAULT_ZAUTOMATION_CREDENTIALS = '~/zaut_credentials.json'
+    DEFAULT_COMMANDS_CACHE = '~/.zaut_commands.cache'
     # noinspection SpellCheckingInspection
     ZAUTO_USER = "username"
     # noinspection SpellCheckingInspection
     ZAUTO_PWD = "password"
     # noinspection SpellCheckingInspection
     ZAUTO_URL = "server_url"
+    ZAUTO_POOL_SIZE = "pool_size"
+    ZAUTO_POOL_IDLE = "pool_idle_timeout"
+    ZAUTO_CONNECT_TIMEOUT = "connect_timeout"
+    ZAUTO_READ_TIMEOUT = "read_timeout"
+    ZAUTO_RETRIES = "retries"
+    ZAUTO_SESSION_AUTH = "session_auth"
+    ZAUTO_BATCH_ACTIONS = "batch_actions"
+    ZAUTO_MAX_IN_FLIGHT = "max_in_flight"
+    ZAUTO_COMMAND_RATE = "command_rate"
     BASE_ORDER = "Wave"
+    FUZZY_THRESHOLD = 0.6
+    COMMANDS_TTL = 300.0
+    # Delay (in seconds) before retrying a failed refresh, doubled on each consecutive failure up to the TTL
+    REFRESH_BACKOFF = 1.0
+    STREAM_LOCATIONS = True
+    # Delay (in seconds) during which a known device state is trusted to skip redundant commands
+    SHADOW_TTL = 30.0
+    # Delay (in seconds) granted to a vocal order, from its reception to the devices' answers
+    ORDER_DEADLINE = 5.0
 
-    def __init__(self, credential_file_path=DEFAULT_ZAUTOMATION_CREDENTIALS):
+    def __init__(self, credential_file_path=DEFAULT_ZAUTOMATION_CREDENTIALS, cache_file_path=DEFAULT_COMMANDS_CACHE):
         """
         Constructor.
+        :param credential_file_path: The path of the ZAutomation credentials
+        :param cache_file_path: The path of the commands cache, None to disable it
         """
         self.logger = logging.getLogger(self.__class__.__name__)
         self.logger.log(logging.DEBUG, "Credential path:{!s} > {!s}".format(credential_file_path,
@@ -52,6 +90,19 @@ class ZwaveMeHelper(object):
         with io.open(os.path.expanduser(credential_file_path), 'r', encoding='utf8') as credential_file:
             self.credentials = json.load(credential_file)
         self._commands = None
+        self.states = ZwaveMeHelper.StateShadow(self.SHADOW_TTL)
+        self._commands_time = None
+        self._commands_ttl = None
+        self._update_time = None
+        self._refresh_lock = threading.Lock()
+        self._refresher_stop = None
+        self._refresh_failures = 0
+        # Time (monotonic) before which no refresh is attempted, after a failed one
+        self._refresh_after = 0.0
+        self._cache = None
+        if cache_file_path is not None:
+            self._cache = self.CommandCache(cache_file_path, self.credentials[ZwaveMeHelper.ZAUTO_URL])
+            self.__warm_start_commands__()
 
     def __str__(self):
         """
@@ -63,69 +114,2032 @@ class ZwaveMeHelper(object):
                                                                             self.credentials[ZwaveMeHelper.ZAUTO_URL]))
         return "It's me, {!s} !".format(self.__class__.__name__)
 
-    def __init_commands__(self):
-        """Initialise the set of commands"""
-        self._commands = {}
-        strategy = self.APIListLocationStrategy(self.credentials)
-        rooms = strategy.apply()
-        # Mandatory to trim the OFF command as google recognize only "of" and not "OFF"
-        ac = [ZwaveMeHelper.APIDeviceActionStrategy.TURN_ON, ZwaveMeHelper.APIDeviceActionStrategy.TURN_OFF,
-              ZwaveMeHelper.APIDeviceActionStrategy.TURN_OFF]
-        ac_voc = [ZwaveMeHelper.APIDeviceActionStrategy.TURN_ON, ZwaveMeHelper.APIDeviceActionStrategy.TURN_OFF,
-                  ZwaveMeHelper.APIDeviceActionStrategy.TURN_OFF[:-1]]
-        action_map = {}
-        action_strategy = self.APIDeviceActionStrategy(self.credentials)
+    def __init_commands__(self, deadline=None):
+        """
+        Initialise the set of commands.
+        :param deadline: The deadline of the order waiting for them
+        :type deadline: ZwaveMeHelper.Deadline
+        """
+        self._fetch_commands(deadline)
+
+    def __warm_start_commands__(self):
+        """Initialise the set of commands from the cache, then revalidate it against the controller"""
+        cached = self._cache.load()
+        if cached is None:
+            return
+        self._build_commands(cached[0])
+        self._update_time = cached[1]
+        self.refresh_commands(wait=False)
+
+    def _fetch_commands(self, deadline=None):
+        """
+        Fetch the locations, then build and persist the set of commands.
+        :param deadline: The deadline of the order waiting for them, None for the requests' own timeouts
+        :type deadline: ZwaveMeHelper.Deadline
+        """
+        # Taken before the locations, so that no later change is missed by the next synchronisation
+        inventory = self._fetch_devices(deadline)
+        rooms = ZwaveMeHelper.APIListLocationStrategy(self.credentials, stream=self.STREAM_LOCATIONS).apply(deadline)
+        self._build_commands(rooms)
+        if inventory is not None:
+            self._seed_states(inventory.devices)
+        self._update_time = None if inventory is None else inventory.update_time
+        self._save_commands()
+
+    def _fetch_devices(self, deadline=None):
+        """
+        Retrieve all the devices with their levels, and the controller's current update time, starting point of the
+        incremental synchronisations.
+        :param deadline: The deadline of the order waiting for the commands
+        :type deadline: ZwaveMeHelper.Deadline
+        :return: ZwaveMeHelper.DeviceChanges|None, None if the controller does not support them
+        """
+        try:
+            return ZwaveMeHelper.APIListDeviceStrategy(self.credentials).apply([0, deadline])
+        except (requests.RequestException, ValueError, KeyError) as error:
+            self.logger.log(logging.INFO, "No incremental synchronisation: {!s}".format(error))
+            return None
+
+    def _seed_states(self, raw_devices):
+        """
+        Fill the state shadow with the levels listed by the controller.
+        :param raw_devices: The devices' data
+        :type raw_devices: list
+        """
+        for raw_device in raw_devices:
+            device = ZwaveMeHelper.ZAutomationDevice(raw_device)
+            if device.level is not None:
+                self.states.update(device.api_id, device.level)
+
+    def _sync_commands(self):
+        """
+        Patch the set of commands with the devices changed since the last synchronisation.
+        :return: bool, False if the whole set of commands must be fetched again
+        """
+        if self._update_time is None or self._commands is None:
+            return False
+        changes = ZwaveMeHelper.APIListDeviceStrategy(self.credentials).apply(self._update_time)
+        if changes.structure_changed:
+            return False
+        grammar = self._commands.copy()
+        for raw_device in changes.devices:
+            device = ZwaveMeHelper.ZAutomationDevice(raw_device)
+            grammar.remove_device(device.api_id)
+            self.states.update(device.api_id, device.level)
+            if raw_device.get("permanently_hidden") or not raw_device.get("visibility", True):
+                continue
+            if not grammar.add_device_to(device.room, device) and device.room:
+                self.logger.log(logging.DEBUG, "Unknown location {!s} for {!s}".format(device.room, device))
+                return False
+        self.logger.log(logging.DEBUG, "{!s} devices synchronised".format(len(changes.devices)))
+        self._commands = grammar
+        self._commands_time = time.monotonic()
+        self._update_time = changes.update_time
+        if changes.devices:
+            self._save_commands()
+        return True
+
+    def _revalidate_commands(self):
+        """Refresh the current set of commands, keeping it on failure"""
+        try:
+            if not self._sync_commands():
+                self._fetch_commands()
+            self._refresh_failures = 0
+        except (requests.RequestException, ValueError) as error:
+            self._refresh_failures += 1
+            delay = min(self._commands_ttl or self.COMMANDS_TTL,
+                        self.REFRESH_BACKOFF * 2 ** (self._refresh_failures - 1))
+            self._refresh_after = time.monotonic() + delay
+            self.logger.log(logging.WARNING, "Keeping current commands, next refresh in {:.1f}s: {!s}".format(
+                delay, error))
+        except Exception:
+            # Never let an unexpected payload end the background refresh
+            self._refresh_failures += 1
+            self._refresh_after = time.monotonic() + (self._commands_ttl or self.COMMANDS_TTL)
+            self.logger.exception("Keeping current commands")
+        finally:
+            self._refresh_lock.release()
+
+    def refresh_commands(self, wait=True):
+        """
+        Rebuild the set of commands from the controller, unless a refresh is already in flight.
+        The current commands keep being served until the new ones are swapped in.
+        :param wait: False to refresh in the background
+        :return: bool, False if a refresh was already in flight
+        """
+        if not self._refresh_lock.acquire(blocking=False):
+            return False
+        if wait:
+            self._revalidate_commands()
+        else:
+            threading.Thread(target=self._revalidate_commands, name="commands-refresh", daemon=True).start()
+        return True
+
+    @property
+    def commands_age(self):
+        """
+        Time elapsed (in seconds) since the set of commands was built.
+        :return: float|None
+        """
+        if self._commands_time is None:
+            return None
+        return time.monotonic() - self._commands_time
+
+    def _refresh_if_stale(self):
+        """Trigger a background refresh once the commands outlived their TTL, serving them meanwhile"""
+        if self._commands_ttl is not None and self.commands_age > self._commands_ttl \
+                and time.monotonic() >= self._refresh_after:
+            self.refresh_commands(wait=False)
+
+    def start_refresh(self, ttl=COMMANDS_TTL):
+        """
+        Periodically refresh the set of commands in the background.
+        :param ttl: The commands time to live (in seconds)
+        """
+        self._commands_ttl = ttl
+        if self._refresher_stop is None:
+            self._refresher_stop = threading.Event()
+            threading.Thread(target=self._refresh_loop, args=(self._refresher_stop,),
+                             name="commands-refresher", daemon=True).start()
+
+    def stop_refresh(self):
+        """Stop the periodic refresh of the set of commands"""
+        self._commands_ttl = None
+        if self._refresher_stop is not None:
+            self._refresher_stop.set()
+            self._refresher_stop = None
 
+    def _refresh_loop(self, stop):
+        """
+        Refresh the set of commands each time they outlive their TTL.
+        :param stop: The event ending the loop
+        :type stop: threading.Event
+        """
+        while True:
+            ttl = self._commands_ttl
+            age = self.commands_age
+            if ttl is None:
+                return
+            delay = max(0.0, ttl - age if age is not None else 0.0, self._refresh_after - time.monotonic())
+            if stop.wait(delay):
+                return
+            if (self.commands_age is None or self.commands_age >= ttl) and time.monotonic() >= self._refresh_after:
+                if not self.refresh_commands(wait=True):
+                    # A refresh is already in flight, check again once it had time to complete
+                    stop.wait(1.0)
+
+    def _save_commands(self):
+        """Persist the locations the commands are built from, if the cache is enabled"""
+        if self._cache is not None:
+            try:
+                self._cache.save(self._commands.inventory(), self._update_time)
+            except OSError as error:
+                self.logger.log(logging.WARNING, "Commands not cached: {!s}".format(error))
+
+    def _build_commands(self, rooms):
+        """
+        Build the command grammar out of the given locations.
+        :param rooms: The locations retrieved from the controller
+        :type rooms: list
+        """
+        grammar = ZwaveMeHelper.CommandGrammar(self.BASE_ORDER, ZwaveMeHelper.APIDeviceActionStrategy.ACTIONS,
+                                               self.APIDeviceActionStrategy(self.credentials),
+                                               ZwaveMeHelper.APIDeviceActionStrategy.LEVELS)
         for room in rooms:
-            switches = []
-            for switch in room.switches:
-                switches.append(switch)
-            action_map[room.name] = switches
-
-        for action_idx in range(len(ac)):
-            for room in action_map.keys():
-                for device in action_map[room]:
-                    command = "{!s} {!s} {!s} in {!s}".format(self.BASE_ORDER, ac_voc[action_idx], device.name, room)\
-                        .lower()
-                    self.logger.log(logging.DEBUG, "New command '{!s}'".format(command))
-                    self._commands[command] = [action_strategy, device, ac[action_idx]]
+            for devices in room.devices.values():
+                for device in devices:
+                    grammar.add_device(room.name, device, room.id)
+        self.logger.log(logging.DEBUG, "New grammar {!s}".format(grammar))
+        self._commands = grammar
+        self._commands_time = time.monotonic()
 
     def get_vocal_commands(self):
         """
         Retrieve the available vocal commands.
-        :return: string
+        :return: generator
         """
         if self._commands is None:
             self.__init_commands__()
-        return self._commands.keys()
+        return self._commands.commands()
 
     @staticmethod
     def clean_command(command):
         """
-        Clean the command being given, if it is between simple quotes.
-        :param command: The command to "clean"
-        :return:
+        Clean the command being given, if it is between simple quotes.
+        :param command: The command to "clean"
+        :return:
+        """
+        if command[:1] == "'" and command[-1:] == "'":
+            return command[1:-1]
+        return command
+
+    def _lookup_command(self, order):
+        """
+        Find the command matching the given order.
+        :param order: The vocal order
+        :return: ZwaveMeHelper.Command|None
+        """
+        with ZwaveMeHelper.Latencies.stage("clean"):
+            cleaned_order = self.clean_command(order)
+        # The grammar may be swapped by a refresh meanwhile
+        commands = self._commands
+        with ZwaveMeHelper.Latencies.stage("parse"):
+            todo = commands.parse(cleaned_order)
+        if todo is None:
+            # Speech recognition rarely gets it exactly right, take the closest command if it is close enough
+            with ZwaveMeHelper.Latencies.stage("resolve"):
+                candidates = commands.resolve(cleaned_order, self.FUZZY_THRESHOLD)
+            if candidates:
+                todo, score = candidates[0]
+                self.logger.log(logging.INFO, "'{!s}' understood as {!s} ({:.2f}).".format(
+                    cleaned_order, ", ".join(str(device) for device in todo.devices), score))
+            else:
+                self.logger.log(logging.ERROR, "'{!s}' unknown.".format(cleaned_order))
+        return todo
+
+    def do_vocal_commands(self, order=None, deadline=ORDER_DEADLINE):
+        """
+        Perform the requested command.
+        :param order: The vocal order
+        :param deadline: The delay (in seconds) granted to the whole order, None for the requests' own timeouts
+        :return: ZwaveMeHelper.CommandResult, true if every targeted device performed the action
+        """
+        deadline = ZwaveMeHelper.Deadline.of(deadline)
+        with ZwaveMeHelper.Latencies.stage("order"):
+            if self._commands is None:
+                self.__init_commands__(deadline)
+            self._refresh_if_stale()
+
+            todo = self._lookup_command(order)
+            if todo is None:
+                return ZwaveMeHelper.CommandResult(order, deadline=deadline)
+            return self._execute(order, todo, deadline)
+
+    def resolve_many(self, hypotheses, deadline=ORDER_DEADLINE):
+        """
+        Perform the command best matching the transcription hypotheses of an order, without asking again.
+        :param hypotheses: The speech recognition's transcriptions of the order, most likely first
+        :param deadline: The delay (in seconds) granted to the whole order, None for the requests' own timeouts
+        :return: ZwaveMeHelper.CommandResult, for the chosen hypothesis
+        """
+        deadline = ZwaveMeHelper.Deadline.of(deadline)
+        with ZwaveMeHelper.Latencies.stage("order"):
+            if self._commands is None:
+                self.__init_commands__(deadline)
+            self._refresh_if_stale()
+
+            order, todo = self._lookup_hypotheses(hypotheses)
+            if todo is None:
+                return ZwaveMeHelper.CommandResult(order, deadline=deadline)
+            return self._execute(order, todo, deadline)
+
+    def _lookup_hypotheses(self, hypotheses):
+        """
+        Find the command best matching one of the given orders.
+        :param hypotheses: The vocal orders, most likely first
+        :return: tuple (the chosen order, ZwaveMeHelper.Command|None)
+        """
+        with ZwaveMeHelper.Latencies.stage("clean"):
+            cleaned_orders = list(self.clean_command(order) for order in hypotheses)
+        commands = self._commands
+        with ZwaveMeHelper.Latencies.stage("resolve"):
+            candidates = commands.resolve_many(cleaned_orders, self.FUZZY_THRESHOLD, 1)
+        if not candidates:
+            self.logger.log(logging.ERROR, "'{!s}' unknown.".format("' / '".join(cleaned_orders)))
+            return (hypotheses[0] if hypotheses else None), None
+        todo, score, index = candidates[0]
+        self.logger.log(logging.INFO, "'{!s}' understood as {!s} ({:.2f}).".format(
+            cleaned_orders[index], ", ".join(str(device) for device in todo.devices), score))
+        return hypotheses[index], todo
+
+    def _execute(self, order, todo, deadline):
+        """
+        Perform a command on the devices not already in the requested state.
+        :param order: The vocal order
+        :param todo: The command
+        :type todo: ZwaveMeHelper.Command
+        :param deadline: The order's deadline
+        :return: ZwaveMeHelper.CommandResult
+        """
+        with ZwaveMeHelper.Latencies.stage("execute"):
+            pending, results = self._skip_noops(todo)
+            if pending:
+                results.update(todo.strategy.apply_group(pending, todo.action, deadline))
+                self.states.record(pending, todo.action, results)
+            return ZwaveMeHelper.CommandResult(order, results, deadline)
+
+    def _skip_noops(self, todo):
+        """
+        Split the devices targeted by a command between the ones to command and the ones already in the
+        requested state, according to the state shadow.
+        :param todo: The command
+        :type todo: ZwaveMeHelper.Command
+        :return: tuple (list of devices, dict of the skipped ones' outcome)
+        """
+        pending = []
+        skipped = {}
+        for device in todo.devices:
+            if self.states.is_noop(device, todo.action):
+                self.logger.log(logging.DEBUG, "{!s} already {!s}".format(device, todo.action))
+                skipped[device.api_id] = True
+            else:
+                pending.append(device)
+        return pending, skipped
+
+    def do_vocal_query(self, order=None, deadline=ORDER_DEADLINE):
+        """
+        Answer a question about a device's state, such as "wave is the plug switch on in the living room" or
+        "wave what is the temperature in the bedroom".
+        The device's level is only requested when the known one is outdated.
+        :param order: The vocal question
+        :param deadline: The delay (in seconds) granted to the whole question, None for the requests' own timeouts
+        :return: ZwaveMeHelper.QueryResult, true if the device is in the asked state
+        """
+        deadline = ZwaveMeHelper.Deadline.of(deadline)
+        if self._commands is None:
+            self.__init_commands__(deadline)
+        self._refresh_if_stale()
+        with ZwaveMeHelper.Latencies.stage("query"):
+            question = self._parse_query(order)
+            if question is None:
+                return ZwaveMeHelper.QueryResult(order)
+            device, state = question
+            strategy = self._device_status()
+            try:
+                level = self.states.fetch(device, lambda target: strategy.apply_blocking([target, deadline]))
+            except (requests.RequestException, ValueError) as error:
+                self.logger.log(logging.ERROR, "Status of {!s} unavailable: {!s}".format(device, error))
+                level = None
+            return ZwaveMeHelper.QueryResult(order, device, level, self.states.in_state(device, level, state))
+
+    def _parse_query(self, order):
+        cleaned_order = self.clean_command(order)
+        question = self._commands.parse_query(cleaned_order, self.FUZZY_THRESHOLD)
+        if question is None:
+            self.logger.log(logging.ERROR, "'{!s}' unknown.".format(cleaned_order))
+        return question
+
+    def partial_order(self):
+        """
+        Start following an order while it is being transcribed.
+        :return: ZwaveMeHelper.PartialOrder
+        """
+        if self._commands is None:
+            self.__init_commands__()
+        return ZwaveMeHelper.PartialOrder(self)
+
+    def _prewarm(self, device, deadline=ORDER_DEADLINE):
+        """
+        Request a device's status, opening the connection to the controller and logging in ahead of the order.
+        :param device: The device likely to be commanded
+        :param deadline: The delay (in seconds) granted to the request, None for its own timeouts
+        """
+        try:
+            status = self._device_status().apply_blocking([device, ZwaveMeHelper.Deadline.of(deadline)])
+            self.states.update(device.api_id, status)
+        except (requests.RequestException, ValueError) as error:
+            self.logger.log(logging.INFO, "Pre-warming for {!s} failed: {!s}".format(device, error))
+
+    def _device_status(self):
+        """
+        Strategy requesting the level of a device.
+        :return: ZwaveMeHelper.APIDeviceStatusStrategy
+        """
+        return self.APIDeviceStatusStrategy(self.credentials)
+
+    Command = collections.namedtuple("Command", ["strategy", "devices", "action"])
+
+    class PartialOrder(object):
+        """
+        Order followed through the partial transcriptions of the speech recognition, the connection to the
+        controller being warmed up as soon as few devices remain candidates.
+        """
+
+        # Number of candidate devices below which the connection is warmed up
+        PREWARM_CANDIDATES = 3
+
+        def __init__(self, helper):
+            """
+            Constructor.
+            :param helper: The helper performing the order
+            :type helper: ZwaveMeHelper
+            """
+            self._helper = helper
+            self.candidates = None
+            self.prewarmed = None
+
+        def feed(self, partial):
+            """
+            Narrow the candidate devices with a newer partial transcription.
+            :param partial: The transcription so far
+            :return: list of ZwaveMeHelper.ZAutomationDevice|None, None until the base order and an action are heard
+            """
+            self.candidates = self._helper._commands.complete(partial)
+            if self.prewarmed is None and self.candidates and len(self.candidates) <= self.PREWARM_CANDIDATES:
+                self.prewarmed = self.candidates[0]
+                threading.Thread(target=self._helper._prewarm, args=(self.prewarmed,), name="zaut-prewarm",
+                                 daemon=True).start()
+            return self.candidates
+
+        def finish(self, order, deadline=None):
+            """
+            Perform the final transcription.
+            :param order: The final transcription
+            :param deadline: The delay (in seconds) granted to the order, the helper's default one by default
+            :return: ZwaveMeHelper.CommandResult, or its awaitable with the asyncio helper
+            """
+            if deadline is None:
+                return self._helper.do_vocal_commands(order)
+            return self._helper.do_vocal_commands(order, deadline)
+
+    class CommandResult(object):
+        """
+        Outcome of a vocal command, true if every targeted device performed the action.
+        """
+
+        def __init__(self, order, results=None, deadline=None):
+            """
+            Constructor.
+            :param order: The vocal order
+            :param results: The outcome of the action, per device id
+            :type results: dict
+            :param deadline: The order's deadline
+            :type deadline: ZwaveMeHelper.Deadline
+            """
+            self.order = order
+            self.results = results or {}
+            # Delay (in seconds) left before the deadline once the command was performed, None without deadline
+            self.remaining = None if deadline is None else deadline.remaining()
+
+        def __str__(self):
+            """
+            Result's textual description
+            :return: str
+            """
+            return "'{!s}' ({!s}/{!s} done)".format(self.order, len(self.results) - len(self.failures),
+                                                   len(self.results))
+
+        def __bool__(self):
+            """
+            Whether the command was understood and fully performed.
+            :return: bool
+            """
+            return bool(self.results) and all(self.results.values())
+
+        @property
+        def failures(self):
+            """
+            Ids of the devices which did not perform the action.
+            :return: list
+            """
+            return list(device_id for device_id, done in self.results.items() if not done)
+
+    class Deadline(object):
+        """
+        Point in time by which an order must be answered, bounding the timeouts of its requests.
+        """
+
+        def __init__(self, budget):
+            """
+            Constructor.
+            :param budget: The delay (in seconds) from now
+            """
+            self.budget = budget
+            self._end = time.monotonic() + budget
+
+        @classmethod
+        def of(cls, budget):
+            """
+            Deadline from a delay, or an already started one.
+            :param budget: The delay (in seconds), a ZwaveMeHelper.Deadline or None
+            :return: ZwaveMeHelper.Deadline|None
+            """
+            if budget is None or isinstance(budget, cls):
+                return budget
+            return cls(budget)
+
+        def remaining(self):
+            """
+            Delay (in seconds) left before the deadline.
+            :return: float, 0 once expired
+            """
+            return max(0.0, self._end - time.monotonic())
+
+        @property
+        def expired(self):
+            """
+            Whether the deadline is over.
+            :return: bool
+            """
+            return self.remaining() == 0.0
+
+        def timeout(self, connect, read):
+            """
+            Connect and read timeouts of a request, bounded by the time left.
+            :param connect: The connect timeout (in seconds) without deadline
+            :param read: The read timeout (in seconds) without deadline
+            :return: tuple (float, float)
+            :raise ZwaveMeHelper.DeadlineExceeded: If no time is left for the request
+            """
+            remaining = self.remaining()
+            if remaining <= 0.0:
+                raise ZwaveMeHelper.DeadlineExceeded("Deadline of {!s}s exceeded".format(self.budget))
+            return min(connect, remaining), min(read, remaining)
+
+    class QueryResult(object):
+        """
+        Answer to a vocal question, true if the device is in the asked state.
+        """
+
+        def __init__(self, order, device=None, value=None, answer=None):
+            """
+            Constructor.
+            :param order: The vocal order
+            :param device: The device the question is about
+            :param value: The device's level, None if unknown
+            :param answer: Whether the device is in the asked state, None if unknown
+            """
+            self.order = order
+            self.device = device
+            self.value = value
+            self.answer = answer
+
+        def __str__(self):
+            """
+            Result's textual description
+            :return: str
+            """
+            return "'{!s}' ({!s}: {!s})".format(self.order, self.device, self.value)
+
+        def __bool__(self):
+            """
+            Whether the device is known to be in the asked state.
+            :return: bool
+            """
+            return self.answer is True
+
+    class StateShadow(object):
+        """
+        Last known level of the devices, fed by the inventory, the commands' outcome and the status requests.
+        """
+
+        # Vocal states, with the level of a binary device (or the test on a numeric level) they stand for
+        STATES = {
+            "on": ("on", lambda level: level > 0),
+            "off": ("off", lambda level: level == 0),
+            "open": ("open", None),
+            "closed": ("close", None),
+            "unlocked": ("open", None),
+            "locked": ("close", None)
+        }
+        # Delay (in seconds) during which a level is trusted to answer a question, per device type
+        STALENESS = {
+            "sensorBinary": 5.0,
+            "sensorMultilevel": 60.0,
+            "thermostat": 60.0
+        }
+
+        def __init__(self, ttl):
+            """
+            Constructor.
+            :param ttl: The delay (in seconds) during which a known level is trusted
+            """
+            self._ttl = ttl
+            # {device id: (level, time)}
+            self._levels = {}
+            # {device id: concurrent.futures.Future}, the status requests in progress
+            self._flights = {}
+            self._flights_lock = threading.Lock()
+
+        def __len__(self):
+            return len(self._levels)
+
+        def update(self, device_id, level, at=None):
+            """
+            Record the level of a device.
+            :param device_id: The device's API id
+            :param level: The device's level, None if unknown
+            :param at: The time (monotonic) the level was observed, now by default
+            """
+            if level is None:
+                self._levels.pop(device_id, None)
+            else:
+                self._levels[device_id] = (level, time.monotonic() if at is None else at)
+
+        def get(self, device_id, max_age=None):
+            """
+            Trusted level of a device.
+            :param device_id: The device's API id
+            :param max_age: The maximal age (in seconds) of the level, the shadow's TTL by default
+            :return: The level, None if unknown or outdated
+            """
+            known = self._levels.get(device_id)
+            if known is None or time.monotonic() - known[1] > (self._ttl if max_age is None else max_age):
+                return None
+            return known[0]
+
+        def max_age(self, device):
+            """
+            Delay (in seconds) during which the level of a device is trusted to answer a question.
+            :param device: The device
+            :return: float
+            """
+            return self.STALENESS.get(device.type, self._ttl)
+
+        def fetch(self, device, loader):
+            """
+            Level of a device, requested only if the known one is outdated.
+            Concurrent calls for the same device share a single request.
+            :param device: The device
+            :param loader: The callable requesting the device's level
+            :return: The level
+            """
+            level = self.get(device.api_id, self.max_age(device))
+            if level is not None:
+                return level
+            with self._flights_lock:
+                flight = self._flights.get(device.api_id)
+                leading = flight is None
+                if leading:
+                    flight = self._flights[device.api_id] = futures.Future()
+            if not leading:
+                return flight.result()
+            try:
+                level = loader(device)
+                self.update(device.api_id, level)
+                flight.set_result(level)
+                return level
+            except BaseException as error:
+                flight.set_exception(error)
+                raise
+            finally:
+                with self._flights_lock:
+                    del self._flights[device.api_id]
+
+        @staticmethod
+        def expected_level(device, action):
+            """
+            Level of a device once an API action is performed.
+            :param device: The device
+            :param action: The API action
+            :return: The level, None if it can not be foreseen
+            """
+            strategy = ZwaveMeHelper.APIDeviceActionStrategy
+            if action.startswith(strategy.EXACT + "?level="):
+                return ZwaveMeHelper.SpokenNumber.parse(action[len(strategy.EXACT + "?level="):])
+            if device.type in (ZwaveMeHelper.ZAutomationDevice.SWITCH_MULTILEVEL,
+                               ZwaveMeHelper.ZAutomationDevice.THERMOSTAT):
+                # Turning on restores the previous level, moving up/down ends anywhere
+                return 0 if action == strategy.TURN_OFF else None
+            if action in (strategy.TURN_ON, strategy.TURN_OFF, strategy.OPEN, strategy.CLOSE):
+                return action
+            return None
+
+        def is_noop(self, device, action):
+            """
+            Whether a device is known to be already in the state an API action would put it in.
+            :param device: The device
+            :param action: The API action
+            :return: bool
+            """
+            expected = self.expected_level(device, action)
+            return expected is not None and self.get(device.api_id) == expected
+
+        def record(self, devices, action, results):
+            """
+            Record the outcome of an API action.
+            :param devices: The devices the action was performed on
+            :param action: The API action
+            :param results: The outcome per device id
+            """
+            for device in devices:
+                self.update(device.api_id, self.expected_level(device, action) if results.get(device.api_id) else None)
+
+        @classmethod
+        def in_state(cls, device, level, state):
+            """
+            Whether a level matches a vocal state.
+            :param device: The device
+            :param level: The device's level, None if unknown
+            :param state: The vocal state, None to only ask for the level
+            :return: bool|None, None if unknown
+            """
+            if state is None:
+                return None if level is None else True
+            if level is None or state not in cls.STATES:
+                return None
+            binary_level, numeric_test = cls.STATES[state]
+            if isinstance(level, (int, float)):
+                return None if numeric_test is None else numeric_test(level)
+            return level == binary_level
+
+    class CommandGrammar(object):
+        """
+        Compiled grammar of the vocal commands : "<base order> <action> <device> in <room>",
+        and "<base order> set <device> to <level> in <room>" for the devices supporting levels.
+        Each slot is resolved through its own index rather than enumerating every combination,
+        the action being checked against the ones supported by the device's type.
+        The inexact orders also match the names their slots sound like, to withstand the speech recognition.
+        """
+
+        ROOM_SEPARATOR = " in "
+        LEVEL_SEPARATOR = " to "
+        SET_ACTION = "set"
+        QUERY_ACTION = "is"
+        VALUE_QUERY_ACTION = "what is"
+        ARTICLE = "the "
+        # Measures asked for in a room, with the types of the devices answering them by preference
+        MEASURES = {
+            "temperature": ("sensorMultilevel", "thermostat")
+        }
+        _LEVEL_UNIT = re.compile(r"\s*(?:%|percents?|per cent|degrees?)$")
+        # Targets of the group commands, with the type of the devices they select (None for all)
+        GROUPS = collections.OrderedDict([("everything", None)] + list(
+            (prefix + group, device_type) for group, device_type in [
+                ("switches", "switchBinary"), ("dimmers", "switchMultilevel"), ("locks", "doorlock")]
+            for prefix in ("all ", "all the ")))
+        _SPACES = re.compile(r"\s+")
+        _PUNCTUATION = re.compile(r"[^\w\s]+")
+
+        def __init__(self, base_order, actions, action_strategy, levels=None):
+            """
+            Constructor.
+            :param base_order: The word every command starts with
+            :type base_order: string
+            :param actions: The API actions indexed by their vocal form, per device type
+            :type actions: dict of collections.OrderedDict
+            :param action_strategy: The strategy performing the actions
+            :type action_strategy: ZwaveMeHelper.AbstractAPIStrategy
+            :param levels: The (minimum, maximum) level, per type of device supporting levels
+            :type levels: dict
+            """
+            self._base_order = self.normalize(base_order)
+            self._actions = actions
+            self._levels = levels or {}
+            self._vocal_actions = list(collections.OrderedDict(
+                (vocal_action, True) for type_actions in actions.values() for vocal_action in type_actions))
+            if self._levels:
+                self._vocal_actions.append(self.SET_ACTION)
+            self._strategy = action_strategy
+            self.devices = ZwaveMeHelper.DeviceRegistry()
+            # {room key: (room name, {device key: device})}
+            self._rooms = collections.OrderedDict()
+            # {room id: room key}
+            self._room_ids = {}
+            # {device id: (room key, device key)}
+            self._device_slots = {}
+            # {sound code: [room key]} and {(room key, sound code): [device key]}, a code standing for several
+            # names being ambiguous
+            self._phonetic_rooms = {}
+            self._phonetic_devices = {}
+            self._slot_indexes = None
+            self._token_tries = None
+            self._prefix = re.compile(r"^{!s} (?P<action>{!s}) (?P<target>.+)$".format(
+                re.escape(self._base_order), "|".join(re.escape(action) for action in self._vocal_actions)))
+
+        def __str__(self):
+            """
+            Grammar's textual description
+            :return: str
+            """
+            return "'{!s}' ({!s} actions, {!s} rooms, {!s} devices)".format(
+                self._base_order, len(self._vocal_actions), len(self._rooms), len(self.devices))
+
+        @classmethod
+        def normalize(cls, text):
+            """
+            Normalize a text for its use as a slot key.
+            :param text: The text to normalize
+            :return: string
+            """
+            return cls._SPACES.sub(" ", text.strip().lower())
+
+        def copy(self):
+            """
+            Copy the grammar's indexes, so that it can be patched while the original one is in use.
+            :return: ZwaveMeHelper.CommandGrammar
+            """
+            grammar = copy.copy(self)
+            grammar.devices = self.devices.copy()
+            grammar._rooms = collections.OrderedDict((room_key, (room_name, collections.OrderedDict(devices)))
+                                                     for room_key, (room_name, devices) in self._rooms.items())
+            grammar._room_ids = dict(self._room_ids)
+            grammar._device_slots = dict(self._device_slots)
+            grammar._phonetic_rooms = dict((code, list(keys)) for code, keys in self._phonetic_rooms.items())
+            grammar._phonetic_devices = dict((code, list(keys)) for code, keys in self._phonetic_devices.items())
+            grammar._slot_indexes = None
+            grammar._token_tries = None
+            return grammar
+
+        def phonetic(self, phrase, voiced=False):
+            """
+            Sound code of a slot, its article excluded.
+            :param phrase: The slot's phrase
+            :param voiced: Whether to keep the voiced consonants apart
+            :return: string
+            """
+            if phrase.startswith(self.ARTICLE):
+                phrase = phrase[len(self.ARTICLE):]
+            return ZwaveMeHelper.PhoneticKey.encode(phrase, voiced)
+
+        def _sounding_key(self, keys, phrase):
+            """
+            Slot key sounding like a phrase, with the confidence of the match: halfway between the shared sound code
+            and the similarity of their voiced codes, so that "lid" stands for "light" with less confidence than
+            "plugs which" for "plug switch".
+            :param keys: The keys sharing the phrase's sound code, None if there is none
+            :param phrase: The slot's phrase
+            :return: tuple (string, float)|None, None if no key or several keys sound like the phrase
+            """
+            if keys is None or len(keys) != 1:
+                return None
+            similarity = ZwaveMeHelper.FuzzyIndex.similarity(self.phonetic(phrase, True), self.phonetic(keys[0], True))
+            return keys[0], (1.0 + similarity) / 2.0
+
+        def _room_key(self, room_phrase, threshold=None):
+            """
+            Key of the room a phrase names, or sounds like confidently enough.
+            :param room_phrase: The room's phrase
+            :param threshold: The minimal confidence of a sounding room, None for the named room only
+            :return: string|None, None if unknown or ambiguous
+            """
+            if room_phrase in self._rooms:
+                return room_phrase
+            if threshold is None:
+                return None
+            sounding = self._sounding_key(self._phonetic_rooms.get(self.phonetic(room_phrase)), room_phrase)
+            return sounding[0] if sounding is not None and sounding[1] >= threshold else None
+
+        def _sounding_device(self, room_key, device_phrase, threshold):
+            """
+            Device of a room whose name sounds like a phrase, confidently enough.
+            :param room_key: The room's key
+            :param device_phrase: The device's phrase
+            :param threshold: The minimal confidence
+            :return: ZwaveMeHelper.ZAutomationDevice|None, None if unknown or ambiguous
+            """
+            sounding = self._sounding_key(self._phonetic_devices.get((room_key, self.phonetic(device_phrase))),
+                                          device_phrase)
+            if sounding is None or sounding[1] < threshold:
+                return None
+            return self._rooms[room_key][1][sounding[0]]
+
+        def add_device(self, room_name, device, room_id=None):
+            """
+            Register a device in the room's slot index.
+            :param room_name: The room's name
+            :param device: The device
+            :type device: ZwaveMeHelper.ZAutomationDevice
+            :param room_id: The room's ZAutomation id
+            """
+            if device.api_id in self._device_slots:
+                self.remove_device(device.api_id)
+            room_key = self.normalize(room_name)
+            room = self._rooms.get(room_key)
+            if room is None:
+                room = self._rooms[room_key] = (room_name, collections.OrderedDict())
+                self._phonetic_rooms.setdefault(self.phonetic(room_key), []).append(room_key)
+            device_key = self.normalize(device.name)
+            if device_key in room[1]:
+                # Homonyms of a room are told apart by their rank, as "temperature 2"
+                rank = 2
+                while "{!s} {!s}".format(device_key, rank) in room[1]:
+                    rank += 1
+                device_key = "{!s} {!s}".format(device_key, rank)
+            self._phonetic_devices.setdefault((room_key, self.phonetic(device_key)), []).append(device_key)
+            room[1][device_key] = device
+            if room_id is not None:
+                self._room_ids[room_id] = room_key
+            self._device_slots[device.api_id] = (room_key, device_key)
+            self.devices.add(device)
+            self._slot_indexes = None
+            self._token_tries = None
+
+        def add_device_to(self, room_id, device):
+            """
+            Register a device in the slot index of a known room.
+            :param room_id: The room's ZAutomation id
+            :param device: The device
+            :type device: ZwaveMeHelper.ZAutomationDevice
+            :return: bool, False if the room is unknown
+            """
+            room_key = self._room_ids.get(room_id)
+            if room_key is None:
+                return False
+            self.add_device(self._rooms[room_key][0], device)
+            return True
+
+        def remove_device(self, device_id):
+            """
+            Unregister a device.
+            :param device_id: The device's API id
+            :return: bool, False if the device was not registered
+            """
+            slot = self._device_slots.pop(device_id, None)
+            if slot is None:
+                return False
+            devices = self._rooms[slot[0]][1]
+            if slot[1] in devices and devices[slot[1]].api_id == device_id:
+                del devices[slot[1]]
+                phonetic_slot = (slot[0], self.phonetic(slot[1]))
+                self._phonetic_devices[phonetic_slot].remove(slot[1])
+                if not self._phonetic_devices[phonetic_slot]:
+                    del self._phonetic_devices[phonetic_slot]
+            self.devices.remove(device_id)
+            self._slot_indexes = None
+            self._token_tries = None
+            return True
+
+        def inventory(self):
+            """
+            Enumerate the rooms and their devices, as registered.
+            :return: generator of (room id, room name, list of devices)
+            """
+            room_ids = dict((room_key, room_id) for room_id, room_key in self._room_ids.items())
+            for room_key, (room_name, devices) in self._rooms.items():
+                yield room_ids.get(room_key), room_name, list(devices.values())
+
+        def action_of(self, device, vocal_action, level=None):
+            """
+            API action performing a vocal action on a device.
+            :param device: The device
+            :param vocal_action: The action's vocal form
+            :param level: The requested level, for the set action
+            :return: string|None, None if the device's type does not support the action
+            """
+            if vocal_action == self.SET_ACTION:
+                if level is None or device.type not in self._levels:
+                    return None
+                minimum, maximum = self._levels[device.type]
+                if minimum is not None:
+                    level = max(minimum, level)
+                if maximum is not None:
+                    level = min(maximum, level)
+                return ZwaveMeHelper.APIDeviceActionStrategy.level_action(level)
+            return self._actions.get(device.type, {}).get(vocal_action)
+
+        def _slots(self, vocal_action, target):
+            """
+            Enumerate the possible splits of an order's target into its slots.
+            :param vocal_action: The action's vocal form
+            :param target: The order, after its action
+            :return: generator of (device phrase, room phrase or None, level or None)
+            """
+            if vocal_action != self.SET_ACTION:
+                yield target, None, None
+                for device_phrase, room_phrase in self._split(target, self.ROOM_SEPARATOR):
+                    yield device_phrase, room_phrase, None
+                return
+            for device_phrase, level_phrase in self._split(target, self.LEVEL_SEPARATOR):
+                # "<device> to <level> in <room>"
+                for level_words, room_phrase in self._split(level_phrase, self.ROOM_SEPARATOR):
+                    level = ZwaveMeHelper.SpokenNumber.parse(self._LEVEL_UNIT.sub("", level_words))
+                    if level is not None:
+                        yield device_phrase, room_phrase, level
+                # "<device> in <room> to <level>", or "<group> to <level>"
+                level = ZwaveMeHelper.SpokenNumber.parse(self._LEVEL_UNIT.sub("", level_phrase))
+                if level is not None:
+                    yield device_phrase, None, level
+                    for located_phrase, room_phrase in self._split(device_phrase, self.ROOM_SEPARATOR):
+                        yield located_phrase, room_phrase, level
+
+        @staticmethod
+        def _split(text, separator):
+            """
+            Split a text in two around each occurrence of a separator, the last one first.
+            :param text: The text to split
+            :param separator: The separator
+            :return: generator of (string, string)
+            """
+            index = text.rfind(separator)
+            while index > 0:
+                yield text[:index], text[index + len(separator):]
+                index = text.rfind(separator, 0, index)
+
+        def parse(self, order):
+            """
+            Extract the action, device, room and level slots of an order.
+            :param order: The vocal order
+            :return: ZwaveMeHelper.Command|None
+            """
+            match = self._prefix.match(self.normalize(order))
+            if match is None:
+                return None
+            vocal_action = match.group("action")
+            for device_phrase, room_phrase, level in self._slots(vocal_action, match.group("target")):
+                if room_phrase is None:
+                    if device_phrase in self.GROUPS:
+                        return self._group_command(vocal_action, self.GROUPS[device_phrase], level=level)
+                    continue
+                room_key = self._room_key(room_phrase)
+                if room_key is not None:
+                    room = self._rooms[room_key]
+                    device = room[1].get(device_phrase)
+                    if device is None and device_phrase in self.GROUPS:
+                        return self._group_command(vocal_action, self.GROUPS[device_phrase], room[1].values(), level)
+                    if device is not None:
+                        action = self.action_of(device, vocal_action, level)
+                        return None if action is None else ZwaveMeHelper.Command(self._strategy, (device,), action)
+            return None
+
+        def parse_query(self, order, threshold=None):
+            """
+            Extract the device and state slots of a question :
+            "<base order> is <device> <state> in <room>", "<base order> is <device> in <room> <state>",
+            "<base order> what is <device> in <room>" or "<base order> what is the <measure> in <room>".
+            :param order: The vocal order
+            :param threshold: The minimal confidence of the slots matched by their sound, None for exact slots only
+            :return: tuple (ZwaveMeHelper.ZAutomationDevice, string|None)|None, no state when the level is asked
+            """
+            order = self.normalize(order)
+            prefix = "{!s} {!s} ".format(self._base_order, self.VALUE_QUERY_ACTION)
+            if order.startswith(prefix):
+                for device_phrase, room_phrase in self._split(order[len(prefix):], self.ROOM_SEPARATOR):
+                    device = self._query_device(device_phrase, room_phrase, threshold)
+                    if device is not None:
+                        return device, None
+                return None
+            prefix = "{!s} {!s} ".format(self._base_order, self.QUERY_ACTION)
+            if not order.startswith(prefix):
+                return None
+            target = order[len(prefix):]
+            for state in ZwaveMeHelper.StateShadow.STATES:
+                candidates = []
+                if target.endswith(" " + state):
+                    candidates.extend(self._split(target[:-len(state) - 1], self.ROOM_SEPARATOR))
+                candidates.extend(self._split(target, " {!s}{!s}".format(state, self.ROOM_SEPARATOR)))
+                for device_phrase, room_phrase in candidates:
+                    device = self._query_device(device_phrase, room_phrase, threshold)
+                    if device is not None:
+                        return device, state
+            return None
+
+        def _query_device(self, device_phrase, room_phrase, threshold=None):
+            """
+            Find the device a question is about, the articles being optional.
+            :param device_phrase: The device's name, or a measure
+            :param room_phrase: The room's name
+            :param threshold: The minimal confidence of the slots matched by their sound, None for exact slots only
+            :return: ZwaveMeHelper.ZAutomationDevice|None
+            """
+            if room_phrase is None:
+                return None
+            room_key = self._room_key(room_phrase)
+            if room_key is None and room_phrase.startswith(self.ARTICLE):
+                room_key = self._room_key(room_phrase[len(self.ARTICLE):])
+            if room_key is None:
+                room_key = self._room_key(room_phrase, threshold)
+            if room_key is None:
+                return None
+            devices = self._rooms[room_key][1]
+            if device_phrase.startswith(self.ARTICLE) and device_phrase not in devices:
+                device_phrase = device_phrase[len(self.ARTICLE):]
+            if device_phrase in devices:
+                return devices[device_phrase]
+            for device_type in self.MEASURES.get(device_phrase, ()):
+                for device in devices.values():
+                    if device.type == device_type:
+                        return device
+            if threshold is None:
+                return None
+            return self._sounding_device(room_key, device_phrase, threshold)
+
+        def _group_command(self, vocal_action, device_type, devices=None, level=None):
+            """
+            Build the command targeting all the devices of the given type supporting the action.
+            :param vocal_action: The action's vocal form
+            :param device_type: The type of the targeted devices, None for all
+            :param devices: The candidate devices, all the registered ones by default
+            :param level: The requested level, for the set action
+            :return: ZwaveMeHelper.Command|None, None if no device is targeted
+            """
+            if vocal_action == self.SET_ACTION and device_type is None:
+                # Setting "everything" to a percentage only makes sense for the dimmers
+                device_type = ZwaveMeHelper.ZAutomationDevice.SWITCH_MULTILEVEL
+            if devices is None:
+                devices = self.devices if device_type is None else self.devices.of_type(device_type)
+            targets = list(device for device in devices if device_type is None or device.type == device_type)
+            actions = list(self.action_of(device, vocal_action, level) for device in targets)
+            # A vocal action is meant to stand for the same API action whatever the device's type
+            action = next((action for action in actions if action is not None), None)
+            if action is None:
+                return None
+            return ZwaveMeHelper.Command(self._strategy, tuple(
+                device for device, device_action in zip(targets, actions) if device_action == action), action)
+
+        @property
+        def slot_indexes(self):
+            """
+            Fuzzy indexes of the device and room slots, built on first use.
+            :return: tuple of ZwaveMeHelper.FuzzyIndex
+            """
+            indexes = self._slot_indexes
+            if indexes is None:
+                devices = {}
+                rooms = ZwaveMeHelper.FuzzyIndex()
+                for room_key, (_, room_devices) in self._rooms.items():
+                    rooms.add(room_key, room_key)
+                    for device_key, device in room_devices.items():
+                        devices.setdefault(device_key, []).append((room_key, device))
+                device_index = ZwaveMeHelper.FuzzyIndex()
+                for device_key, located_devices in devices.items():
+                    device_index.add(device_key, located_devices)
+                indexes = self._slot_indexes = (device_index, rooms)
+            return indexes
+
+        @property
+        def token_tries(self):
+            """
+            Token tries of the device and room slots, built on first use.
+            :return: tuple of ZwaveMeHelper.TokenTrie
+            """
+            tries = self._token_tries
+            if tries is None:
+                devices = ZwaveMeHelper.TokenTrie()
+                rooms = ZwaveMeHelper.TokenTrie()
+                for room_key, (_, room_devices) in self._rooms.items():
+                    rooms.add(self._tokens(room_key.split(" ")), room_key)
+                    for device_key, device in room_devices.items():
+                        devices.add(self._tokens(device_key.split(" ")), (room_key, device))
+                tries = self._token_tries = (devices, rooms)
+            return tries
+
+        def _tokens(self, words):
+            """
+            Words of a phrase looked up in the token tries, the articles being skipped.
+            :param words: The phrase's words
+            :return: list of string
+            """
+            return list(word for word in words if word + " " != self.ARTICLE)
+
+        def complete(self, partial):
+            """
+            Narrow the devices an order may target while it is being transcribed.
+            :param partial: The partial transcription, its last word being possibly unfinished
+            :return: list of ZwaveMeHelper.ZAutomationDevice|None, None until the base order and an action are heard
+            """
+            unfinished = not partial[-1:].isspace()
+            words = self.normalize(self._PUNCTUATION.sub(" ", partial)).split(" ")
+            if len(words) < 2 or words[0] != self._base_order:
+                return None
+            vocal_action = words[1]
+            if len(words) == 2 and unfinished:
+                # The action may still be unfinished too
+                return None if not any(action.startswith(vocal_action) for action in self._vocal_actions) else []
+            if vocal_action not in self._vocal_actions:
+                return None
+            words = self._tokens(words[2:])
+            device_words, room_words = words, None
+            separator = self.ROOM_SEPARATOR.strip()
+            if separator in words:
+                index = len(words) - 1 - words[::-1].index(separator)
+                device_words, room_words = words[:index], words[index + 1:]
+            device_unfinished = unfinished and room_words is None
+            separator = self.LEVEL_SEPARATOR.strip()
+            if vocal_action == self.SET_ACTION and separator in device_words:
+                device_words = device_words[:device_words.index(separator)]
+                device_unfinished = False
+            device_trie, room_trie = self.token_tries
+            candidates = device_trie.complete(device_words, device_unfinished)
+            if room_words:
+                room_keys = set(room_trie.complete(room_words, unfinished))
+                candidates = list(candidate for candidate in candidates if candidate[0] in room_keys)
+            if vocal_action == self.SET_ACTION:
+                return list(device for _, device in candidates if device.type in self._levels)
+            return list(device for _, device in candidates if self.action_of(device, vocal_action) is not None)
+
+        def resolve(self, order, threshold, limit=3, searches=None):
+            """
+            Rank the commands closest to an order which does not exactly match the grammar.
+            The confidence of a command is the one of its least similar slot.
+            :param order: The vocal order
+            :param threshold: The minimal confidence, between 0 and 1
+            :param limit: The maximal number of candidates
+            :param searches: The slot searches already performed, shared by the orders resolved together
+            :type searches: dict
+            :return: list of (ZwaveMeHelper.Command, float), best first
+            """
+            words = self.normalize(self._PUNCTUATION.sub(" ", order.replace("_", " "))).split(" ")
+            if len(words) < 3 or words[0] != self._base_order or words[1] not in self._vocal_actions:
+                return []
+            vocal_action = words[1]
+            device_index, room_index = self.slot_indexes
+            if searches is None:
+                searches = {}
+            # {device id: (score, device, action)}
+            scores = {}
+            for device_phrase, room_phrase, level in self._slots(vocal_action, " ".join(words[2:])):
+                if room_phrase is None:
+                    continue
+                room_matches = searches.get((False, room_phrase))
+                if room_matches is None:
+                    room_matches = searches[(False, room_phrase)] = room_index.search(room_phrase, limit)
+                device_matches = searches.get((True, device_phrase))
+                if device_matches is None:
+                    device_matches = searches[(True, device_phrase)] = device_index.search(device_phrase, limit)
+                rooms = dict((room_key, score) for score, room_key, _ in room_matches)
+                # The slots sounding like the phrases compete with the ones spelled like them
+                sounding = self._sounding_key(self._phonetic_rooms.get(self.phonetic(room_phrase)), room_phrase)
+                if sounding is not None and sounding[1] > rooms.get(sounding[0], 0.0):
+                    rooms[sounding[0]] = sounding[1]
+                matches = list((device_score, located_devices) for device_score, _, located_devices in device_matches)
+                device_code = self.phonetic(device_phrase)
+                for room_key in rooms:
+                    sounding = self._sounding_key(self._phonetic_devices.get((room_key, device_code)), device_phrase)
+                    if sounding is not None:
+                        matches.append((sounding[1], [(room_key, self._rooms[room_key][1][sounding[0]])]))
+                for device_score, located_devices in matches:
+                    for room_key, device in located_devices:
+                        score = min(device_score, rooms.get(room_key, 0.0))
+                        if score >= threshold and score > scores.get(device.api_id, (0.0,))[0]:
+                            action = self.action_of(device, vocal_action, level)
+                            if action is not None:
+                                scores[device.api_id] = (score, device, action)
+            ranked = sorted(scores.values(), key=lambda scored: scored[0], reverse=True)[:limit]
+            return list((ZwaveMeHelper.Command(self._strategy, (device,), action), score)
+                        for score, device, action in ranked)
+
+        def resolve_many(self, orders, threshold, limit=3):
+            """
+            Rank the commands matching the transcription hypotheses of an order. The exactly matching hypotheses
+            come first, then the closest commands of all the hypotheses, each phrase shared by several hypotheses
+            being searched once.
+            :param orders: The vocal orders, most likely first
+            :param threshold: The minimal confidence, between 0 and 1
+            :param limit: The maximal number of candidates
+            :return: list of (ZwaveMeHelper.Command, float, int), with the index of the matching order, best first
+            """
+            exact = []
+            for index, order in enumerate(orders):
+                command = self.parse(order)
+                if command is not None:
+                    exact.append((command, 1.0, index))
+                    if len(exact) == limit:
+                        return exact
+            searches = {}
+            candidates = []
+            for index, order in enumerate(orders):
+                candidates.extend((command, score, index)
+                                  for command, score in self.resolve(order, threshold, limit, searches))
+            # The most likely hypothesis wins the ties
+            candidates.sort(key=lambda candidate: (-candidate[1], candidate[2]))
+            return (exact + candidates)[:limit]
+
+        def commands(self):
+            """
+            Lazily enumerate the commands accepted by the grammar.
+            :return: generator
+            """
+            for vocal_action in self._vocal_actions:
+                if vocal_action == self.SET_ACTION:
+                    # Not enumerated, there is one per level
+                    continue
+                types = set(device_type for device_type, actions in self._actions.items() if vocal_action in actions)
+                for room_name, devices in self._rooms.values():
+                    for device_key, device in devices.items():
+                        if device.type in types:
+                            yield "{!s} {!s} {!s} in {!s}".format(
+                                self._base_order, vocal_action, device_key, room_name).lower()
+                for group, device_type in self.GROUPS.items():
+                    if device_type is None or device_type in types:
+                        yield "{!s} {!s} {!s}".format(self._base_order, vocal_action, group)
+                        for room_name, _ in self._rooms.values():
+                            yield "{!s} {!s} {!s} in {!s}".format(
+                                self._base_order, vocal_action, group, room_name).lower()
+
+    class TokenTrie(object):
+        """
+        Trie of phrases word by word, enumerating the values of the phrases starting with given words.
+        """
+
+        __slots__ = ("children", "values")
+
+        def __init__(self):
+            """
+            Constructor.
+            """
+            # {word: ZwaveMeHelper.TokenTrie}
+            self.children = {}
+            self.values = []
+
+        def add(self, words, value):
+            """
+            Register a phrase.
+            :param words: The phrase's words
+            :param value: The value of the phrase
+            """
+            node = self
+            for word in words:
+                child = node.children.get(word)
+                if child is None:
+                    child = node.children[word] = ZwaveMeHelper.TokenTrie()
+                node = child
+            node.values.append(value)
+
+        def complete(self, words, unfinished=False):
+            """
+            Values of the phrases starting with the given words.
+            :param words: The first words
+            :param unfinished: Whether the last word may be the beginning of a longer one
+            :return: list
+            """
+            nodes = [self]
+            for position, word in enumerate(words):
+                if unfinished and position == len(words) - 1:
+                    nodes = list(child for node in nodes for key, child in node.children.items()
+                                 if key.startswith(word))
+                else:
+                    nodes = list(node.children[word] for node in nodes if word in node.children)
+            # Breadth first, the shortest phrases first
+            values = []
+            nodes = collections.deque(nodes)
+            while nodes:
+                node = nodes.popleft()
+                values.extend(node.values)
+                nodes.extend(node.children.values())
+            return values
+
+    class DeviceRegistry(object):
+        """
+        Devices of all types, indexed by id and by type.
+        """
+
+        def __init__(self):
+            """
+            Constructor.
+            """
+            self._by_id = collections.OrderedDict()
+            # {device type: {device id: device}}
+            self._by_type = {}
+
+        def __len__(self):
+            """
+            Number of registered devices.
+            :return: int
+            """
+            return len(self._by_id)
+
+        def __iter__(self):
+            return iter(list(self._by_id.values()))
+
+        def copy(self):
+            """
+            Copy the registry's indexes.
+            :return: ZwaveMeHelper.DeviceRegistry
+            """
+            registry = ZwaveMeHelper.DeviceRegistry()
+            registry._by_id = collections.OrderedDict(self._by_id)
+            registry._by_type = dict((device_type, collections.OrderedDict(devices))
+                                     for device_type, devices in self._by_type.items())
+            return registry
+
+        def add(self, device):
+            """
+            Register a device, replacing any previous one with the same id.
+            :param device: The device
+            :type device: ZwaveMeHelper.ZAutomationDevice
+            """
+            self.remove(device.api_id)
+            self._by_id[device.api_id] = device
+            self._by_type.setdefault(device.type, collections.OrderedDict())[device.api_id] = device
+
+        def remove(self, device_id):
+            """
+            Unregister a device.
+            :param device_id: The device's API id
+            :return: ZwaveMeHelper.ZAutomationDevice|None, the unregistered device
+            """
+            device = self._by_id.pop(device_id, None)
+            if device is not None:
+                del self._by_type[device.type][device_id]
+            return device
+
+        def get(self, device_id):
+            """
+            Find a device.
+            :param device_id: The device's API id
+            :return: ZwaveMeHelper.ZAutomationDevice|None
+            """
+            return self._by_id.get(device_id)
+
+        def of_type(self, device_type):
+            """
+            Devices of a given type.
+            :param device_type: The ZAutomation device type
+            :return: list of ZwaveMeHelper.ZAutomationDevice
+            """
+            return list(self._by_type.get(device_type, {}).values())
+
+        def types(self):
+            """
+            Types of the registered devices.
+            :return: list of string
+            """
+            return list(device_type for device_type, devices in self._by_type.items() if devices)
+
+    class SpokenNumber(object):
+        """
+        Parser of the numbers given in digits or in words, as transcribed by the speech recognition.
+        """
+
+        UNITS = dict((word, value) for value, word in enumerate(
+            "zero one two three four five six seven eight nine ten eleven twelve thirteen fourteen fifteen sixteen "
+            "seventeen eighteen nineteen".split()))
+        TENS = dict((word, (value + 2) * 10) for value, word in enumerate(
+            "twenty thirty forty fifty sixty seventy eighty ninety".split()))
+
+        @classmethod
+        def parse(cls, text):
+            """
+            Parse a number.
+            :param text: The number, as "40", "40.5", "forty", "forty-five" or "a hundred"
+            :return: int|float|None, None if the text is not a number
+            """
+            text = text.strip()
+            try:
+                value = float(text)
+                if value == value and abs(value) != float("inf"):
+                    return int(value) if value.is_integer() else value
+                return None
+            except ValueError:
+                pass
+            words = list(word for word in text.replace("-", " ").split() if word != "and")
+            if not words:
+                return None
+            if words[0] in ("a", "one") and words[1:] == ["hundred"]:
+                return 100
+            value = 0
+            for position, word in enumerate(words):
+                if word in cls.TENS and value % 100 == 0:
+                    value += cls.TENS[word]
+                elif word in cls.UNITS and value % 10 == 0 and (value % 100 == 0 or cls.UNITS[word] < 10):
+                    value += cls.UNITS[word]
+                elif word == "hundred" and position > 0 and 0 < value < 10:
+                    value *= 100
+                else:
+                    return None
+            return value
+
+    class PhoneticKey(object):
+        """
+        Metaphone-like sound code of a phrase, ignoring the word boundaries and the voicing of the consonants,
+        so that the usual mishearings ("plugs which" for "plug switch", "launch" for "lounge") share the code
+        of the name they stand for. The voiced code tells such sounds apart, to weigh how alike they are.
+        """
+
+        # Rewritings applied in turn to the lower-case letters and digits of the phrase
+        _RULES = list((re.compile(pattern), replacement) for pattern, replacement in [
+            (r"^(?:kn|gn|pn|wr|ae)", lambda match: match.group(0)[1]),
+            (r"^x", "s"),
+            (r"x", "ks"),
+            (r"([^c\d])\1+", r"\1"),
+            (r"mb$", "m"),
+            (r"wh", "w"),
+            (r"tch", "ch"),
+            (r"sch", "sk"),
+            (r"(?:ch|sh|ci(?=[ao])|si(?=[ao])|ti(?=[ao]))", "x"),
+            (r"c(?=[iey])", "s"),
+            (r"ck", "k"),
+            (r"ph", "f"),
+            # Its own symbol, neither a t nor a digit: "bathroom" must not sound like "bedroom"
+            (r"th", "T"),
+            (r"dg(?=[eiy])", "j"),
+            (r"gh(?![aeiou])", ""),
+            (r"gn(?:ed)?$", "n"),
+            (r"g(?=[iey])", "j"),
+            (r"(?<=[aeiou])h(?![aeiou])", ""),
+            (r"[wy](?![aeiou])", ""),
+            (r"q", "k"),
+            (r"c", "k"),
+            (r"(?<!^)[aeiouy]+", ""),
+            (r"^[aeiouy]+", "a"),
+            (r"h", "")
+        ])
+        # Voiced consonants folded on their voiceless counterparts
+        _UNVOICED = str.maketrans("bdgjvz", "ptkxfs")
+        _ALPHANUMERIC = re.compile(r"[^a-z\d]+")
+
+        @classmethod
+        def encode(cls, text, voiced=False):
+            """
+            Sound code of a phrase.
+            :param text: The phrase
+            :param voiced: Whether to keep the voiced consonants apart from their voiceless counterparts
+            :return: string, empty if the phrase has no letters nor digits
+            """
+            code = cls._ALPHANUMERIC.sub("", text.lower())
+            for pattern, replacement in cls._RULES:
+                code = pattern.sub(replacement, code)
+            return code if voiced else code.translate(cls._UNVOICED)
+
+    class FuzzyIndex(object):
+        """
+        Trigram inverted index ranking its keys by similarity (Dice coefficient) with a query.
+        """
+
+        def __init__(self):
+            """
+            Constructor.
+            """
+            self._keys = []
+            self._values = []
+            self._sizes = []
+            # {trigram: [key position]}
+            self._postings = {}
+
+        def __len__(self):
+            """
+            Number of indexed keys.
+            :return: int
+            """
+            return len(self._keys)
+
+        @staticmethod
+        def trigrams(text):
+            """
+            Split a text into its set of trigrams, padded so that word boundaries count.
+            :param text: The text to split
+            :return: set
+            """
+            padded = "  {!s} ".format(text)
+            return set(padded[i:i + 3] for i in range(len(padded) - 2))
+
+        @classmethod
+        def similarity(cls, first, second):
+            """
+            Similarity (Dice coefficient) of two texts' trigrams.
+            :param first: A text
+            :param second: Another text
+            :return: float, between 0 and 1
+            """
+            first, second = cls.trigrams(first), cls.trigrams(second)
+            return 2.0 * len(first & second) / (len(first) + len(second))
+
+        def add(self, key, value):
+            """
+            Index a key.
+            :param key: The indexed text
+            :param value: The value returned when the key matches
+            """
+            position = len(self._keys)
+            grams = self.trigrams(key)
+            self._keys.append(key)
+            self._values.append(value)
+            self._sizes.append(len(grams))
+            for gram in grams:
+                self._postings.setdefault(gram, []).append(position)
+
+        def search(self, text, limit=3):
+            """
+            Rank the keys the most similar to a text.
+            :param text: The searched text
+            :param limit: The maximal number of results
+            :return: list of (score, key, value), best first
+            """
+            grams = self.trigrams(text)
+            shared = collections.Counter()
+            for gram in grams:
+                postings = self._postings.get(gram)
+                if postings is not None:
+                    shared.update(postings)
+            size = len(grams)
+            scored = sorted(((2.0 * count / (size + self._sizes[position]), position)
+                             for position, count in shared.items()), reverse=True)[:limit]
+            return list((score, self._keys[position], self._values[position]) for score, position in scored)
+
+    class Latencies(object):
+        """
+        Per-stage latency histograms, shared by the helpers and strategies.
+        Disabled by default, the stages then cost a single attribute check.
+        """
+
+        # Upper bounds of the histogram buckets, in milliseconds
+        BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, float("inf"))
+
+        enabled = False
+        # {stage: [count, total, max, [count per bucket]]}
+        _histograms = {}
+        _lock = threading.Lock()
+        _dump_stop = None
+
+        class _Stage(object):
+            """
+            Context timing a stage.
+            """
+
+            __slots__ = ("_name", "_start")
+
+            def __init__(self, name):
+                self._name = name
+                self._start = None
+
+            def __enter__(self):
+                self._start = time.perf_counter()
+                return self
+
+            def __exit__(self, *exc_info):
+                ZwaveMeHelper.Latencies.record(self._name, (time.perf_counter() - self._start) * 1000.0)
+                return False
+
+        class _NoStage(object):
+            """
+            Context of a stage which is not timed.
+            """
+
+            __slots__ = ()
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc_info):
+                return False
+
+        _NO_STAGE = _NoStage()
+
+        @classmethod
+        def stage(cls, name):
+            """
+            Context timing a stage, if enabled.
+            :param name: The stage's name
+            :return: context manager
+            """
+            if not cls.enabled:
+                return cls._NO_STAGE
+            return cls._Stage(name)
+
+        @classmethod
+        def record(cls, name, duration):
+            """
+            Record the duration of a stage.
+            :param name: The stage's name
+            :param duration: The duration, in milliseconds
+            """
+            bucket = bisect.bisect_left(cls.BUCKETS, duration)
+            with cls._lock:
+                histogram = cls._histograms.get(name)
+                if histogram is None:
+                    histogram = cls._histograms[name] = [0, 0.0, 0.0, [0] * len(cls.BUCKETS)]
+                histogram[0] += 1
+                histogram[1] += duration
+                histogram[2] = max(histogram[2], duration)
+                histogram[3][bucket] += 1
+
+        @classmethod
+        def _percentile(cls, counts, count, ratio):
+            rank = ratio * count
+            seen = 0
+            for bound, bucket_count in zip(cls.BUCKETS, counts):
+                seen += bucket_count
+                if seen >= rank:
+                    return bound
+            return cls.BUCKETS[-1]
+
+        @classmethod
+        def snapshot(cls):
+            """
+            Summary of the recorded durations, per stage (percentiles are bucket upper bounds).
+            :return: dict
+            """
+            with cls._lock:
+                histograms = dict((name, (count, total, maximum, list(counts)))
+                                  for name, (count, total, maximum, counts) in cls._histograms.items())
+            return dict((name, {
+                "count": count,
+                "mean_ms": total / count,
+                "max_ms": maximum,
+                "p50_ms": cls._percentile(counts, count, 0.5),
+                "p95_ms": cls._percentile(counts, count, 0.95),
+                "buckets": dict((str(bound), bucket_count)
+                                for bound, bucket_count in zip(cls.BUCKETS, counts) if bucket_count)
+            }) for name, (count, total, maximum, counts) in histograms.items())
+
+        @classmethod
+        def reset(cls):
+            """Forget the recorded durations"""
+            with cls._lock:
+                cls._histograms.clear()
+
+        @classmethod
+        def enable(cls, dump_interval=None):
+            """
+            Start recording the durations.
+            :param dump_interval: The delay (in seconds) between two logs of the summary, None for no log
+            """
+            cls.enabled = True
+            if dump_interval is not None and cls._dump_stop is None:
+                cls._dump_stop = threading.Event()
+                threading.Thread(target=cls._dump_loop, args=(cls._dump_stop, dump_interval),
+                                 name="latencies-dump", daemon=True).start()
+
+        @classmethod
+        def disable(cls):
+            """Stop recording the durations"""
+            cls.enabled = False
+            if cls._dump_stop is not None:
+                cls._dump_stop.set()
+                cls._dump_stop = None
+
+        @classmethod
+        def _dump_loop(cls, stop, interval):
+            logger = logging.getLogger(cls.__name__)
+            while not stop.wait(interval):
+                for name, summary in sorted(cls.snapshot().items()):
+                    logger.log(logging.INFO, "{!s}: {!s} x {:.3f}ms (p50 {!s}ms, p95 {!s}ms, max {:.3f}ms)".format(
+                        name, summary["count"], summary["mean_ms"], summary["p50_ms"], summary["p95_ms"],
+                        summary["max_ms"]))
+
+    class CommandCache(object):
+        """
+        Versioned on-disk snapshot of the locations the command grammar is built from.
+        Layout : magic, format version, then the zlib compressed JSON inventory.
+        """
+
+        MAGIC = b"ZWMC"
+        VERSION = 3
+        _HEADER = struct.Struct(">4sH")
+
+        def __init__(self, path, server_url):
+            """
+            Constructor.
+            :param path: The cache file path
+            :param server_url: The controller the inventory belongs to
+            """
+            self._logger = logging.getLogger(self.__class__.__name__)
+            self._path = os.path.expanduser(path)
+            self._server_url = server_url
+
+        def __str__(self):
+            """
+            Cache's textual description
+            :return: str
+            """
+            return "'{!s}'".format(self._path)
+
+        def load(self):
+            """
+            Read the cached locations.
+            :return: tuple (list of ZwaveMeHelper.ZAutomationLocation, controller's update time),
+                     None if missing, outdated or corrupted
+            """
+            try:
+                with io.open(self._path, 'rb') as cache_file:
+                    raw = cache_file.read()
+                magic, version = self._HEADER.unpack_from(raw)
+                if magic != self.MAGIC or version != self.VERSION:
+                    self._logger.log(logging.INFO, "Ignoring cache {!s} version {!s}".format(self, version))
+                    return None
+                inventory = json.loads(zlib.decompress(raw[self._HEADER.size:]).decode("utf8"))
+            except (OSError, struct.error, zlib.error, ValueError) as error:
+                self._logger.log(logging.DEBUG, "No usable cache {!s}: {!s}".format(self, error))
+                return None
+            if inventory["server"] != self._server_url:
+                return None
+            locations = []
+            for room_id, title, devices in inventory["rooms"]:
+                namespaces = collections.OrderedDict()
+                for device_id, device_name, device_type in devices:
+                    namespaces.setdefault(device_type, []).append({ZwaveMeHelper.ZAutomationDevice._ID: device_id,
+                                                                   ZwaveMeHelper.ZAutomationDevice._NAME: device_name})
+                locations.append(ZwaveMeHelper.ZAutomationLocation({
+                    "id": room_id,
+                    "title": title,
+                    "namespaces": list({"id": ZwaveMeHelper.ZAutomationLocation._NAMESPACE + device_type,
+                                        "params": params} for device_type, params in namespaces.items())}))
+            return locations, inventory["update_time"]
+
+        def save(self, rooms, update_time=None):
+            """
+            Write the locations, atomically replacing the previous cache.
+            :param rooms: The rooms' id, name and devices
+            :type rooms: iterable
+            :param update_time: The controller's update time the locations are up to date with
+            :type update_time: int
+            """
+            inventory = {
+                "server": self._server_url,
+                "update_time": update_time,
+                "rooms": list([room_id, room_name, list([device.api_id, device.name, device.type]
+                                                        for device in devices)]
+                              for room_id, room_name, devices in rooms)
+            }
+            payload = zlib.compress(json.dumps(inventory, separators=(",", ":")).encode("utf8"))
+            temporary_path = self._path + ".tmp"
+            with io.open(temporary_path, 'wb') as cache_file:
+                cache_file.write(self._HEADER.pack(self.MAGIC, self.VERSION))
+                cache_file.write(payload)
+            os.replace(temporary_path, self._path)
+
+    class CircuitOpenError(requests.ConnectionError):
+        """
+        Request refused without being sent, the controller being considered down.
+        """
+
+    class DeadlineExceeded(requests.Timeout):
+        """
+        Request refused without being sent, the order's deadline being over.
+        """
+
+    class CircuitBreaker(object):
+        """
+        Failure tracker of a controller, refusing the requests while it seems down then letting a single trial
+        request through once in a while.
+        """
+
+        # Consecutive failures opening the circuit
+        FAILURE_THRESHOLD = 5
+        # Delay (in seconds) before letting a trial request through an open circuit
+        RESET_TIMEOUT = 10.0
+
+        def __init__(self, name):
+            """
+            Constructor.
+            :param name: The controller's URL
+            """
+            self.name = name
+            self._failures = 0
+            self._opened_at = None
+            self._trying = False
+            self._lock = threading.Lock()
+
+        @property
+        def is_open(self):
+            """
+            Whether the requests are currently refused.
+            :return: bool
+            """
+            return self._opened_at is not None
+
+        def allow(self):
+            """
+            Whether a request may be sent, the first one after the reset timeout being the trial one.
+            :return: bool
+            """
+            with self._lock:
+                if self._opened_at is None:
+                    return True
+                if self._trying or time.monotonic() - self._opened_at < self.RESET_TIMEOUT:
+                    return False
+                self._trying = True
+                return True
+
+        def success(self):
+            """Record a request answered by the controller, closing the circuit"""
+            with self._lock:
+                self._failures = 0
+                self._opened_at = None
+                self._trying = False
+
+        def cancel(self):
+            """Record a request given up before being sent, letting another trial request through"""
+            with self._lock:
+                self._trying = False
+
+        def failure(self):
+            """Record a request not answered by the controller, opening the circuit past the threshold"""
+            with self._lock:
+                self._failures += 1
+                if self._trying or self._failures >= self.FAILURE_THRESHOLD:
+                    self._opened_at = time.monotonic()
+                self._trying = False
+
+    class AirtimeScheduler(object):
+        """
+        Pacing of the commands sent to the Z-Wave devices of a controller, so that a group command does not flood
+        the mesh: a token bucket bounds the command rate, a semaphore the commands in flight, and the devices of a
+        same node are interleaved with the other nodes' instead of being commanded back to back.
+        """
+
+        # Z-Way virtual devices of a physical node: ZWayVDev_zway_<node>-<instance>-<command class>...
+        _NODE = re.compile(r"^ZWayVDev_zway_(?P<node>\d+)-")
+
+        def __init__(self, rate, burst, max_in_flight):
+            """
+            Constructor.
+            :param rate: The number of commands per second
+            :param burst: The number of commands that can be sent at once after an idle period
+            :param max_in_flight: The maximum number of commands awaiting the controller's answer
+            """
+            self.rate = rate
+            self.burst = burst
+            self._tokens = float(burst)
+            self._filled_at = time.monotonic()
+            self._lock = threading.Lock()
+            self._in_flight = threading.BoundedSemaphore(max_in_flight)
+
+        @classmethod
+        def node_of(cls, device):
+            """
+            Z-Wave node of a device.
+            :param device: The device
+            :return: int, None for a device not on the mesh
+            """
+            match = cls._NODE.match(device.api_id)
+            return None if match is None else int(match.group("node"))
+
+        @classmethod
+        def interleave(cls, devices):
+            """
+            Order devices so that the ones of a same node are as far apart as possible.
+            :param devices: The devices
+            :return: list
+            """
+            by_node = collections.OrderedDict()
+            for device in devices:
+                by_node.setdefault(cls.node_of(device), collections.deque()).append(device)
+            ordered = []
+            while by_node:
+                for node in list(by_node):
+                    ordered.append(by_node[node].popleft())
+                    if not by_node[node]:
+                        del by_node[node]
+            return ordered
+
+        def _reserve(self):
+            """
+            Take a token, possibly in advance.
+            :return: float, the delay (in seconds) before the token is actually available
+            """
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(float(self.burst), self._tokens + (now - self._filled_at) * self.rate)
+                self._filled_at = now
+                self._tokens -= 1.0
+                return 0.0 if self._tokens >= 0.0 else -self._tokens / self.rate
+
+        def _release(self):
+            with self._lock:
+                self._tokens += 1.0
+
+        @contextlib.contextmanager
+        def slot(self, device, deadline=None):
+            """
+            Wait for the right to send a command to a device.
+            :param device: The device
+            :param deadline: The order's deadline
+            :type deadline: ZwaveMeHelper.Deadline
+            """
+            if self.node_of(device) is None:
+                yield
+                return
+            delay = self._reserve()
+            if deadline is not None and deadline.remaining() <= delay:
+                self._release()
+                raise ZwaveMeHelper.DeadlineExceeded("Deadline of {!s}s exceeded before commanding {!s}".format(
+                    deadline.budget, device))
+            if delay:
+                time.sleep(delay)
+            if not self._in_flight.acquire(timeout=None if deadline is None else deadline.remaining()):
+                raise ZwaveMeHelper.DeadlineExceeded("Deadline of {!s}s exceeded before commanding {!s}".format(
+                    deadline.budget, device))
+            try:
+                yield
+            finally:
+                self._in_flight.release()
+
+    class RetryBudget(object):
+        """
+        Token bucket shared by all the requests, each one earning a fraction of a retry, so that retries stay a
+        bounded share of the traffic when the controller fails as a whole.
         """
-        if command[:1] == "'" and command[-1:] == "'":
-            return command[1:-1]
-        return command
 
-    def do_vocal_commands(self, order=None):
+        # Retries earned per request
+        RATIO = 0.2
+        # Retries that can be saved up, also available from the start
+        CAPACITY = 10.0
+
+        def __init__(self):
+            self._tokens = self.CAPACITY
+            self._lock = threading.Lock()
+
+        def deposit(self):
+            """Record a first attempt"""
+            with self._lock:
+                self._tokens = min(self.CAPACITY, self._tokens + self.RATIO)
+
+        def withdraw(self):
+            """
+            Take a retry from the budget.
+            :return: bool, false if the budget is exhausted
+            """
+            with self._lock:
+                if self._tokens < 1.0:
+                    return False
+                self._tokens -= 1.0
+                return True
+
+    class SessionTokenAuth(auth.AuthBase):
         """
-        Perform the requested command.
-        :return: bool
+        Authentication by the session token obtained at login, sparing the controller a password check per request.
         """
-        if self._commands is None:
-            self.__init_commands__()
 
-        cleaned_order = self.clean_command(order)
-        try:
-            todo = self._commands[cleaned_order]
-            todo[0].apply([todo[1], todo[2]])
-            return True
-        except KeyError as ke:
-            self.logger.log(logging.ERROR, "'{!s}' unknown.".format(ke))
-        return False
+        HEADER = "ZWAYSession"
+
+        def __init__(self, token):
+            self.token = token
+
+        def __call__(self, request):
+            request.headers[self.HEADER] = self.token
+            return request
 
     class AbstractAPIStrategy(metaclass=abc.ABCMeta):
         """
@@ -133,17 +2147,42 @@ class ZwaveMeHelper(object):
         """
 
         BASE_URL = "/ZAutomation/api/v1"
+        POOL_SIZE = 10
+        POOL_IDLE_TIMEOUT = 60.0
+        CONNECT_TIMEOUT = 3.05
+        READ_TIMEOUT = 10.0
+        RETRIES = 2
+        # Bounds (in seconds) of the jittered exponential backoff between attempts
+        BACKOFF_BASE = 0.05
+        BACKOFF_CAP = 1.0
+        RETRY_STATUSES = (500, 502, 503, 504)
+        # Pacing of the Z-Wave commands: commands per second, burst after an idle period, commands in flight
+        COMMAND_RATE = 25.0
+        COMMAND_BURST = 8
+        MAX_IN_FLIGHT = 4
+
+        # Keep-alive sessions shared by all strategies, per controller URL: {url: [session, last_used]}
+        _sessions = {}
+        _sessions_lock = threading.Lock()
+        # Circuit breakers and command schedulers, per controller URL, and retry budget shared by all strategies
+        _breakers = {}
+        _schedulers = {}
+        _retry_budget = None
+        LOGIN_URL = "/login"
+        # Session tokens shared by all strategies, per controller URL, False if the login is not supported
+        _tokens = {}
+        _login_lock = threading.Lock()
 
         # noinspection SpellCheckingInspection
-        def __init__(self, zautomation_credentials, base_path, zautomation_protocol=requests.get):
+        def __init__(self, zautomation_credentials, base_path, zautomation_protocol="get"):
             """
             Constructor.
             :param zautomation_credentials: The necessary credential information for the request.
             :type zautomation_credentials: dict
             :param base_path: The API method's path.
             :type base_path: string
-            :param zautomation_protocol: The request method to use.
-            :type zautomation_protocol: method
+            :param zautomation_protocol: The HTTP verb to use on the shared session, or a request method.
+            :type zautomation_protocol: string|method
             """
 
             self._logger = logging.getLogger(self.__class__.__name__)
@@ -191,17 +2230,285 @@ class ZwaveMeHelper(object):
             return self.server_url + self._url
 
         @property
-        def method(self):
-            return self._protocol
+        def pool_size(self):
+            """
+            Maximum number of kept-alive connections towards the controller.
+            :return: int
+            """
+            return int(self._credentials.get(ZwaveMeHelper.ZAUTO_POOL_SIZE, self.POOL_SIZE))
+
+        @property
+        def pool_idle_timeout(self):
+            """
+            Delay (in seconds) after which an unused session is closed.
+            :return: float
+            """
+            return float(self._credentials.get(ZwaveMeHelper.ZAUTO_POOL_IDLE, self.POOL_IDLE_TIMEOUT))
+
+        def timeout(self, deadline=None):
+            """
+            Connect and read timeouts of a request, bounded by the deadline if any.
+            :param deadline: The deadline of the order the request belongs to
+            :type deadline: ZwaveMeHelper.Deadline
+            :return: tuple (float, float)
+            """
+            connect = float(self._credentials.get(ZwaveMeHelper.ZAUTO_CONNECT_TIMEOUT, self.CONNECT_TIMEOUT))
+            read = float(self._credentials.get(ZwaveMeHelper.ZAUTO_READ_TIMEOUT, self.READ_TIMEOUT))
+            if deadline is None:
+                return connect, read
+            return deadline.timeout(connect, read)
 
         @property
-        def authentication(self):
+        def retries(self):
             """
-            Generate the required authentication.
-            :return: requests.auth.HTTPBasicAuth
+            Maximum number of retries of a failed request.
+            :return: int
             """
+            return int(self._credentials.get(ZwaveMeHelper.ZAUTO_RETRIES, self.RETRIES))
+
+        @property
+        def breaker(self):
+            """
+            Circuit breaker of the controller.
+            :return: ZwaveMeHelper.CircuitBreaker
+            """
+            cls = ZwaveMeHelper.AbstractAPIStrategy
+            with cls._sessions_lock:
+                breaker = cls._breakers.get(self.server_url)
+                if breaker is None:
+                    breaker = cls._breakers[self.server_url] = ZwaveMeHelper.CircuitBreaker(self.server_url)
+                return breaker
+
+        @property
+        def scheduler(self):
+            """
+            Command scheduler of the controller.
+            :return: ZwaveMeHelper.AirtimeScheduler
+            """
+            cls = ZwaveMeHelper.AbstractAPIStrategy
+            with cls._sessions_lock:
+                scheduler = cls._schedulers.get(self.server_url)
+                if scheduler is None:
+                    rate = float(self._credentials.get(ZwaveMeHelper.ZAUTO_COMMAND_RATE, self.COMMAND_RATE))
+                    max_in_flight = int(self._credentials.get(ZwaveMeHelper.ZAUTO_MAX_IN_FLIGHT, self.MAX_IN_FLIGHT))
+                    scheduler = cls._schedulers[self.server_url] = ZwaveMeHelper.AirtimeScheduler(
+                        rate, self.COMMAND_BURST, max_in_flight)
+                return scheduler
+
+        @property
+        def retry_budget(self):
+            """
+            Retry budget shared by all the strategies.
+            :return: ZwaveMeHelper.RetryBudget
+            """
+            cls = ZwaveMeHelper.AbstractAPIStrategy
+            with cls._sessions_lock:
+                if cls._retry_budget is None:
+                    cls._retry_budget = ZwaveMeHelper.RetryBudget()
+                return cls._retry_budget
+
+        def backoff(self, attempt):
+            """
+            Delay before a retry, drawn uniformly up to an exponentially growing bound.
+            :param attempt: The number of failed attempts
+            :return: float, in seconds
+            """
+            return random.uniform(0.0, min(self.BACKOFF_CAP, self.BACKOFF_BASE * 2 ** attempt))
+
+        @property
+        def session(self):
+            """
+            Shared keep-alive session towards the controller.
+            :return: requests.Session
+            """
+            now = time.monotonic()
+            cls = ZwaveMeHelper.AbstractAPIStrategy
+            with cls._sessions_lock:
+                # Evict the sessions left unused for too long, their connections are likely dropped anyway
+                for url, (session, last_used) in list(cls._sessions.items()):
+                    if now - last_used > self.pool_idle_timeout:
+                        self._logger.log(logging.DEBUG, "Closing idle session for {!s}".format(url))
+                        session.close()
+                        del cls._sessions[url]
+                entry = cls._sessions.get(self.server_url)
+                if entry is None:
+                    session = requests.Session()
+                    adapter = adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                    session.mount("http://", adapter)
+                    session.mount("https://", adapter)
+                    entry = cls._sessions[self.server_url] = [session, now]
+                entry[1] = now
+                return entry[0]
+
+        @classmethod
+        def close_sessions(cls):
+            """
+            Close all the shared sessions.
+            """
+            with ZwaveMeHelper.AbstractAPIStrategy._sessions_lock:
+                for session, _ in ZwaveMeHelper.AbstractAPIStrategy._sessions.values():
+                    session.close()
+                ZwaveMeHelper.AbstractAPIStrategy._sessions.clear()
+                ZwaveMeHelper.AbstractAPIStrategy._tokens.clear()
+
+        @property
+        def method(self):
+            """
+            Request method bound to the shared session.
+            :return: method
+            """
+            if callable(self._protocol):
+                return self._protocol
+            return getattr(self.session, self._protocol)
+
+        def authentication(self, deadline=None):
+            """
+            Generate the required authentication: the controller's session token, logging in if needed, or the
+            basic authentication if the session authentication is disabled or not supported.
+            :param deadline: The deadline of the order the login belongs to
+            :type deadline: ZwaveMeHelper.Deadline
+            :return: ZwaveMeHelper.SessionTokenAuth|requests.auth.HTTPBasicAuth
+            """
+            if self._credentials.get(ZwaveMeHelper.ZAUTO_SESSION_AUTH, True):
+                cls = ZwaveMeHelper.AbstractAPIStrategy
+                token = cls._tokens.get(self.server_url)
+                if token is None:
+                    with cls._login_lock:
+                        token = cls._tokens.get(self.server_url)
+                        if token is None:
+                            token = cls._tokens[self.server_url] = self._login(deadline)
+                if token:
+                    return ZwaveMeHelper.SessionTokenAuth(token)
             return auth.HTTPBasicAuth(self.username, self.password)
 
+        def _login(self, deadline=None):
+            """
+            Open a session on the controller.
+            :param deadline: The deadline of the order the login belongs to
+            :type deadline: ZwaveMeHelper.Deadline
+            :return: string, the session token, False if the controller does not support it
+            """
+            url = self.server_url + self.BASE_URL + self.LOGIN_URL
+            self._logger.log(logging.DEBUG, "Logging in with {!s}".format(url))
+            result = self.session.post(url, json={"login": self.username, "password": self.password},
+                                       timeout=self.timeout(deadline))
+            if result.status_code in (404, 405):
+                self._logger.log(logging.INFO, "No session login on {!s}, using basic authentication".format(url))
+                return False
+            result.raise_for_status()
+            return result.json()["data"]["sid"]
+
+        def _expire_token(self, authentication):
+            """
+            Forget a session token refused by the controller, unless another request already replaced it.
+            :param authentication: The refused authentication
+            :return: bool, whether the request may be sent again with a new token
+            """
+            if not isinstance(authentication, ZwaveMeHelper.SessionTokenAuth):
+                return False
+            cls = ZwaveMeHelper.AbstractAPIStrategy
+            with cls._login_lock:
+                if cls._tokens.get(self.server_url) == authentication.token:
+                    del cls._tokens[self.server_url]
+            self._logger.log(logging.INFO, "Session expired on {!s}, logging in again".format(self.server_url))
+            return True
+
+        def _request(self, url, deadline=None, idempotent=True, **kwargs):
+            """
+            Send a request to the controller, with the strategy's method, authentication and timeouts.
+            Connection failures and server errors are retried after a jittered backoff, within the retry budget and
+            the deadline, unless the controller's circuit breaker refuses them. A request refused for an expired
+            session is sent again once logged in.
+            :param url: The requested URL
+            :param deadline: The deadline of the order the request belongs to
+            :type deadline: ZwaveMeHelper.Deadline
+            :param idempotent: Whether the request may be performed twice, otherwise it is only retried when it
+            surely did not reach the controller
+            :param kwargs: The request's options
+            :return: requests.Response, possibly a server error once the retries are exhausted
+            """
+            breaker = self.breaker
+            budget = self.retry_budget
+            budget.deposit()
+            attempt = 0
+            logged_in = False
+            while True:
+                if deadline is not None and deadline.expired:
+                    raise ZwaveMeHelper.DeadlineExceeded("Deadline of {!s}s exceeded before requesting {!s}".format(
+                        deadline.budget, url))
+                if not breaker.allow():
+                    raise ZwaveMeHelper.CircuitOpenError("Circuit open for {!s}".format(breaker.name))
+                authentication = None
+                try:
+                    with ZwaveMeHelper.Latencies.stage("auth"):
+                        authentication = self.authentication(deadline)
+                    response = self._send(url, authentication, deadline, **kwargs)
+                except ZwaveMeHelper.DeadlineExceeded:
+                    # Given up before sending, which tells nothing about the controller
+                    breaker.cancel()
+                    raise
+                except (requests.ConnectionError, requests.Timeout) as error:
+                    breaker.failure()
+                    # A failed login did not send the request itself
+                    unsent = authentication is None or self._unsent(error)
+                    if not (idempotent or unsent) or not self._retry(attempt, deadline, budget, error):
+                        raise
+                except BaseException:
+                    # Neither answered nor refused (failed login, garbled answer...): never leave the trial pending
+                    breaker.failure()
+                    raise
+                else:
+                    if response.status_code not in self.RETRY_STATUSES:
+                        breaker.success()
+                        if response.status_code == 401 and not logged_in and self._expire_token(authentication):
+                            logged_in = True
+                            response.close()
+                            continue
+                        return response
+                    breaker.failure()
+                    if not idempotent or not self._retry(attempt, deadline, budget, response.status_code):
+                        return response
+                    response.close()
+                attempt += 1
+
+        @staticmethod
+        def _unsent(error):
+            """
+            Whether a failed request surely did not reach the controller, its connection never being established.
+            :param error: The request's failure
+            :return: bool
+            """
+            if isinstance(error, (requests.ConnectTimeout, ZwaveMeHelper.CircuitOpenError,
+                                  ZwaveMeHelper.DeadlineExceeded)):
+                return True
+            reason = getattr(error.args[0], "reason", None) if error.args else None
+            return isinstance(reason, urllib3_exceptions.NewConnectionError)
+
+        def _send(self, url, authentication, deadline, **kwargs):
+            with ZwaveMeHelper.Latencies.stage("http." + self.__class__.__name__):
+                return self.method(url, auth=authentication, timeout=self.timeout(deadline), **kwargs)
+
+        def _retry(self, attempt, deadline, budget, cause):
+            """
+            Wait before a retry, if one is allowed.
+            :param attempt: The number of retries already performed
+            :param deadline: The deadline of the order the request belongs to
+            :param budget: The retry budget
+            :param cause: The failure, for logging purpose
+            :return: bool, whether to retry
+            """
+            if attempt >= self.retries:
+                return False
+            delay = self.backoff(attempt)
+            if deadline is not None and deadline.remaining() <= delay:
+                return False
+            if not budget.withdraw():
+                self._logger.log(logging.WARNING, "Retry budget exhausted, not retrying {!s}".format(cause))
+                return False
+            self._logger.log(logging.INFO, "Retrying in {:.3f}s after {!s}".format(delay, cause))
+            time.sleep(delay)
+            return True
+
         @abc.abstractmethod
         def apply(self, param=None):
             """
@@ -210,17 +2517,28 @@ class ZwaveMeHelper(object):
             :return: json
             """
 
+        def apply_blocking(self, param=None):
+            """
+            Perform the strategy's business, blocking the caller.
+            :param param: The strategy's request parameters
+            :return: json
+            """
+            return self.apply(param)
+
     class ZAutomationDeviceList(object):
         """
         Collection of devices.
         """
 
+        __slots__ = ("id", "params")
+
         def __init__(self, data):
             """
             Constructor
             :param data: The collection's data
             """
-            self.__dict__ = data
+            self.id = data["id"]
+            self.params = data["params"]
 
         def __str__(self):
             """
@@ -231,33 +2549,45 @@ class ZwaveMeHelper(object):
 
     class ZAutomationDevice(object):
         """
-        Device.
+        Device, keeping only the fields used by the helper.
+        Built either from a location's namespace entry or from a /devices entry.
         """
         _ID = "deviceId"
         _NAME = "deviceName"
+        SWITCH_BINARY = "switchBinary"
+        SWITCH_MULTILEVEL = "switchMultilevel"
+        SWITCH_RGBW = "switchRGBW"
+        DOORLOCK = "doorlock"
+        THERMOSTAT = "thermostat"
+        SENSOR_BINARY = "sensorBinary"
+        SENSOR_MULTILEVEL = "sensorMultilevel"
+        # Keep the whole payload of the devices, for debugging purpose
+        KEEP_RAW = False
 
-        def __init__(self, data):
+        __slots__ = ("id", "name", "type", "room", "level", "raw")
+
+        def __init__(self, data, device_type=None, room=None, keep_raw=None):
             """
             Constructor
             :param data: The device's data
+            :param device_type: The device's type, if not part of the data
+            :param room: The device's location id, if not part of the data
+            :param keep_raw: Whether to keep the data, KEEP_RAW by default
             """
-            self.__dict__ = data
-            self._components = None
+            metrics = data.get("metrics", {})
+            self.id = data[self._ID] if self._ID in data else data["id"]
+            self.name = data[self._NAME] if self._NAME in data else metrics["title"]
+            self.type = data.get("deviceType", device_type)
+            self.room = data.get("location", room)
+            self.level = metrics.get("level")
+            self.raw = data if (self.KEEP_RAW if keep_raw is None else keep_raw) else None
 
         def __str__(self):
             """
             Device's textual description
             :return: string
             """
-            return "'{!s}[{!s}]'".format(self.deviceName, self.deviceId)
-
-        @property
-        def name(self):
-            """
-            Device's name.
-            :return: string
-            """
-            return self.deviceName
+            return "'{!s}[{!s}]'".format(self.name, self.id)
 
         @property
         def api_id(self):
@@ -265,21 +2595,55 @@ class ZwaveMeHelper(object):
             Device's API compliant id.
             :return: string
             """
-            return self.deviceId  # .replace("-", ":")
+            return self.id  # .replace("-", ":")
 
     class ZAutomationLocation(object):
         """
-        Location object.
+        Location object, keeping only the fields used by the helper.
         """
-        _SWITCHES = "devices_switchBinary"
+        _NAMESPACE = "devices_"
+        # Namespace duplicating all the others
+        _ALL = "devices_all"
+        # Keep the whole payload of the locations, for debugging purpose
+        KEEP_RAW = False
 
-        def __init__(self, data):
+        __slots__ = ("id", "title", "devices", "raw")
+
+        def __init__(self, data, keep_raw=None):
             """
             Constructor
             :param data: The location's data
+            :param keep_raw: Whether to keep the data, KEEP_RAW by default
+            """
+            self.id = data.get("id")
+            self.title = data["title"]
+            # {device type: [device]}, filled in a single pass over the namespaces
+            self.devices = collections.OrderedDict()
+            seen = set()
+            for raw_devices in data.get("namespaces", []):
+                if raw_devices["id"].startswith(self._NAMESPACE) and raw_devices["id"] != self._ALL:
+                    devices = ZwaveMeHelper.ZAutomationDeviceList(raw_devices)
+                    self._add_devices(devices.params, devices.id[len(self._NAMESPACE):], seen, keep_raw)
+            self.raw = data if (self.KEEP_RAW if keep_raw is None else keep_raw) else None
+
+        def _add_devices(self, params, device_type, seen, keep_raw):
             """
-            self.__dict__ = data
-            self._switches = None
+            Add the devices of a namespace, some of them being grouped in sub-namespaces (per probe type...).
+            :param params: The namespace's entries
+            :param device_type: The namespace's device type
+            :param seen: The ids of the devices already added
+            :param keep_raw: Whether to keep the data
+            """
+            if not isinstance(params, list):
+                return
+            for entry in params:
+                if ZwaveMeHelper.ZAutomationDevice._ID in entry:
+                    if entry[ZwaveMeHelper.ZAutomationDevice._ID] not in seen:
+                        seen.add(entry[ZwaveMeHelper.ZAutomationDevice._ID])
+                        self.devices.setdefault(device_type, []).append(
+                            ZwaveMeHelper.ZAutomationDevice(entry, device_type, self.id, keep_raw))
+                elif "params" in entry:
+                    self._add_devices(entry["params"], device_type, seen, keep_raw)
 
         def __str__(self):
             """
@@ -294,38 +2658,225 @@ class ZwaveMeHelper(object):
 
         @property
         def switches(self):
-            if self._switches is None:
-                self._switches = []
-                # Get the list corresponding to the switches
-                filtered_list_switches = list(devices for devices in self.namespaces if devices["id"] == self._SWITCHES)
-                for raw_device in filtered_list_switches:
-                    switches = ZwaveMeHelper.ZAutomationDeviceList(raw_device)
-                    for raw_switch in switches.params:
-                        device = ZwaveMeHelper.ZAutomationDevice(raw_switch)
-                        self._switches.append(device)
-            return self._switches
+            """
+            Location's binary switches.
+            :return: list of ZwaveMeHelper.ZAutomationDevice
+            """
+            return self.devices.get(ZwaveMeHelper.ZAutomationDevice.SWITCH_BINARY, [])
+
+    class JSONEnvelopeStream(object):
+        """
+        Incremental parser of a ZAutomation response, yielding the items of its "data" array as they arrive.
+        Only one item at a time is held decoded, the rest of the payload being skipped as it is read.
+        """
+
+        def __init__(self, chunks, key="data"):
+            """
+            Constructor.
+            :param chunks: The response's body, as a sequence of bytes
+            :type chunks: iterable
+            :param key: The streamed array's key in the envelope
+            """
+            self._chunks = iter(chunks)
+            self._key = key
+            self._decoder = json.JSONDecoder()
+            self._utf8 = codecs.getincrementaldecoder("utf8")()
+            self._buffer = ""
+            self._position = 0
+            self._eof = False
+
+        def __iter__(self):
+            self._expect("{")
+            if self._peek() == "}":
+                return
+            while True:
+                key = self._decode()
+                self._expect(":")
+                if key == self._key and self._peek() == "[":
+                    self._expect("[")
+                    if self._peek() == "]":
+                        self._expect("]")
+                    else:
+                        while True:
+                            yield self._decode()
+                            if self._separator("]"):
+                                break
+                else:
+                    self._decode()
+                if self._separator("}"):
+                    return
+
+        def _fill(self):
+            """
+            Read the next chunk.
+            :return: bool, False at the end of the body
+            """
+            if self._eof:
+                return False
+            # Drop what was already parsed, not to parse it again
+            self._buffer = self._buffer[self._position:]
+            self._position = 0
+            for chunk in self._chunks:
+                if chunk:
+                    self._buffer += self._utf8.decode(chunk)
+                    return True
+            self._buffer += self._utf8.decode(b"", final=True)
+            self._eof = True
+            return False
+
+        def _peek(self):
+            """
+            Skip the blanks, then look at the next character.
+            :return: string
+            """
+            while True:
+                while self._position < len(self._buffer) and self._buffer[self._position].isspace():
+                    self._position += 1
+                if self._position < len(self._buffer):
+                    return self._buffer[self._position]
+                if not self._fill():
+                    raise ValueError("Truncated JSON response")
+
+        def _expect(self, character):
+            if self._peek() != character:
+                raise ValueError("Expected '{!s}' at '{!s}'".format(character, self._buffer[self._position:][:20]))
+            self._position += 1
+
+        def _separator(self, closing):
+            """
+            Consume the separator following a value.
+            :param closing: The character closing the current collection
+            :return: bool, True if the collection is closed
+            """
+            if self._peek() == closing:
+                self._position += 1
+                return True
+            self._expect(",")
+            return False
+
+        def _decode(self):
+            """
+            Decode the next complete value, reading as much as needed.
+            :return: object
+            """
+            self._peek()
+            while True:
+                try:
+                    value, end = self._decoder.raw_decode(self._buffer, self._position)
+                    # A number or literal is complete only once followed by something
+                    if end < len(self._buffer) or self._eof:
+                        self._position = end
+                        return value
+                except ValueError:
+                    if self._eof:
+                        raise
+                self._fill()
 
     class APIListLocationStrategy(AbstractAPIStrategy):
         """API request strategy for listing locations"""
 
         URL = "/locations"
+        CHUNK_SIZE = 8192
 
         # noinspection SpellCheckingInspection
-        def __init__(self, zautomation_credentials):
+        def __init__(self, zautomation_credentials, stream=False):
             """
             Constructor of the strategy in charge of requesting the list of devices.
             :param zautomation_credentials: The necessary connection information.
+            :param stream: Whether to parse the locations while they are downloaded.
             """
-            super().__init__(zautomation_credentials, self.BASE_URL + self.URL, requests.get)
+            super().__init__(zautomation_credentials, self.BASE_URL + self.URL)
+            self._stream = stream
 
         def apply(self, param=None):
-            self._logger.log(logging.DEBUG, "Requested with {!s}/{!s}".format(self.server_full_url, str(param)))
-            result = self.method(self.server_full_url, auth=self.authentication)
-            result.raise_for_status()
-            locations = []
-            for raw_location in result.json()["data"]:
-                locations.append(ZwaveMeHelper.ZAutomationLocation(raw_location))
-            return locations
+            """
+            Request the locations.
+            :param param: The deadline of the order waiting for them, if any
+            :type param: ZwaveMeHelper.Deadline
+            :return: list of ZwaveMeHelper.ZAutomationLocation, or their generator in streaming mode
+            """
+            self._logger.log(logging.DEBUG, "Requested with {!s}".format(self.server_full_url))
+            if self._stream:
+                return self._stream_locations(param)
+            with ZwaveMeHelper.Latencies.stage("apply." + self.__class__.__name__):
+                result = self._request(self.server_full_url, param)
+                result.raise_for_status()
+                locations = []
+                for raw_location in result.json()["data"]:
+                    locations.append(ZwaveMeHelper.ZAutomationLocation(raw_location))
+                return locations
+
+        def _stream_locations(self, deadline=None):
+            """
+            Request the locations, yielding each of them as soon as it is downloaded.
+            :param deadline: The deadline of the order waiting for them
+            :type deadline: ZwaveMeHelper.Deadline
+            :return: generator of ZwaveMeHelper.ZAutomationLocation
+            """
+            result = self._request(self.server_full_url, deadline, stream=True)
+            with contextlib.closing(result):
+                result.raise_for_status()
+                for raw_location in ZwaveMeHelper.JSONEnvelopeStream(result.iter_content(self.CHUNK_SIZE)):
+                    yield ZwaveMeHelper.ZAutomationLocation(raw_location)
+
+    DeviceChanges = collections.namedtuple("DeviceChanges", ["structure_changed", "update_time", "devices"])
+
+    class APIListDeviceStrategy(AbstractAPIStrategy):
+        """API request strategy for listing the devices changed since a given time"""
+
+        URL = "/devices"
+
+        # noinspection SpellCheckingInspection
+        def __init__(self, zautomation_credentials):
+            """
+            Constructor of the strategy in charge of requesting the changed devices.
+            :param zautomation_credentials: The necessary connection information.
+            """
+            super().__init__(zautomation_credentials, self.BASE_URL + self.URL)
+
+        def apply(self, param=None):
+            """
+            Request the devices changed since the given controller's time.
+            :param param: The controller's update time, 0 or None for all the devices, optionally followed by the
+            deadline of the order waiting for them
+            :return: ZwaveMeHelper.DeviceChanges
+            """
+            since, deadline = param if isinstance(param, list) else (param, None)
+            self._logger.log(logging.DEBUG, "Requested with {!s}/{!s}".format(self.server_full_url, str(since)))
+            with ZwaveMeHelper.Latencies.stage("apply." + self.__class__.__name__):
+                result = self._request(self.server_full_url, deadline, params={"since": since or 0})
+                result.raise_for_status()
+                data = result.json()["data"]
+                return ZwaveMeHelper.DeviceChanges(bool(data.get("structureChanged")), data["updateTime"],
+                                                   data.get("devices", []))
+
+    class APIDeviceStatusStrategy(AbstractAPIStrategy):
+        """API request strategy for reading the level of a device"""
+
+        URL = "/devices/{!s}"
+
+        # noinspection SpellCheckingInspection
+        def __init__(self, zautomation_credentials):
+            """
+            Constructor of the strategy in charge of requesting a device's status.
+            :param zautomation_credentials: The necessary connection information.
+            """
+            super().__init__(zautomation_credentials, self.BASE_URL + self.URL)
+
+        def apply(self, param=None):
+            """
+            Request the level of a device.
+            :param param: The device, optionally followed by the deadline of the order it belongs to
+            :type param: ZwaveMeHelper.ZAutomationDevice|list
+            :return: The device's level, None if unknown
+            """
+            device, deadline = param if isinstance(param, list) else (param, None)
+            url = self.server_full_url.format(device.api_id)
+            self._logger.log(logging.DEBUG, "Requested with {!s}".format(url))
+            with ZwaveMeHelper.Latencies.stage("apply." + self.__class__.__name__):
+                result = self._request(url, deadline)
+                result.raise_for_status()
+                return ZwaveMeHelper.ZAutomationDevice(result.json()["data"]).level
 
     class APIDeviceActionStrategy(AbstractAPIStrategy):
         """API request strategy for activating/deactivating device"""
@@ -333,6 +2884,28 @@ class ZwaveMeHelper(object):
         URL = "/devices/{!s}/command/{!s}"  # replace device id - by :
         TURN_ON = "on"
         TURN_OFF = "off"
+        UP = "up"
+        DOWN = "down"
+        OPEN = "open"
+        CLOSE = "close"
+        EXACT = "exact"
+        # Mandatory to accept the trimmed OFF command as google recognize only "of" and not "OFF"
+        _SWITCH_ACTIONS = [(TURN_ON, TURN_ON), (TURN_OFF, TURN_OFF), (TURN_OFF[:-1], TURN_OFF)]
+        # API actions indexed by their vocal form, per device type.
+        # A vocal form stands for the same API action whatever the type, for the group commands.
+        ACTIONS = {
+            "switchBinary": collections.OrderedDict(_SWITCH_ACTIONS),
+            "switchRGBW": collections.OrderedDict(_SWITCH_ACTIONS),
+            "switchMultilevel": collections.OrderedDict(_SWITCH_ACTIONS + [("raise", UP), ("lower", DOWN)]),
+            "doorlock": collections.OrderedDict([(OPEN, OPEN), (CLOSE, CLOSE), ("unlock", OPEN), ("lock", CLOSE)])
+        }
+        # (minimum, maximum) level of the devices supporting the exact action, per type
+        LEVELS = {
+            "switchMultilevel": (0, 99),
+            "thermostat": (None, None)
+        }
+        # Actions moving a device from its current level, which must not be performed twice
+        RELATIVE_ACTIONS = (UP, DOWN)
 
         # noinspection SpellCheckingInspection
         def __init__(self, zautomation_credentials):
@@ -340,19 +2913,368 @@ class ZwaveMeHelper(object):
             Constructor of the strategy in charge of requesting the list of devices.
             :param zautomation_credentials: The necessary connection information.
             """
-            super().__init__(zautomation_credentials, self.BASE_URL + self.URL, requests.get)
+            super().__init__(zautomation_credentials, self.BASE_URL + self.URL)
 
         def apply(self, param=None):
+            """
+            Perform an action on a device.
+            :param param: The device, the API action and optionally the order's deadline
+            :return: bool
+            """
             if param is not None:
                 if isinstance(param[0], ZwaveMeHelper.ZAutomationDevice):
                     command = self.server_full_url.format(param[0].api_id, param[1])
+                    deadline = param[2] if len(param) > 2 else None
                     self._logger.log(logging.DEBUG, "Requested with {!s}".format(command))
-                    result = self.method(command, auth=self.authentication)
-                    result.raise_for_status()
+                    with ZwaveMeHelper.Latencies.stage("apply." + self.__class__.__name__):
+                        with self.scheduler.slot(param[0], deadline):
+                            result = self._request(command, deadline, param[1] not in self.RELATIVE_ACTIONS)
+                        result.raise_for_status()
+                    return True
                 else:
                     self._logger.log(logging.ERROR, "Wrong param provided : {!s}".format(param.__class__.__name__))
             else:
                 self._logger.log(logging.ERROR, "No param provided")
+            return False
+
+        @classmethod
+        def level_action(cls, level):
+            """
+            API action setting a device to a given level.
+            :param level: The level (percentage of a dimmer, temperature of a thermostat...)
+            :return: string
+            """
+            return "{!s}?level={!s}".format(cls.EXACT, level)
+
+        def _apply_safely(self, device, action, deadline=None):
+            """
+            Perform the action on a device, reporting the failure instead of raising it.
+            :param device: The device
+            :param action: The API action
+            :param deadline: The order's deadline
+            :return: bool
+            """
+            try:
+                return self.apply_blocking([device, action, deadline])
+            except requests.RequestException as error:
+                self._logger.log(logging.ERROR, "{!s} failed on {!s}: {!s}".format(action, device, error))
+                return False
+
+        def apply_group(self, devices, action, deadline=None):
+            """
+            Perform the action on several devices, in parallel up to the connection pool size, paced by the
+            controller's airtime scheduler.
+            The devices still waiting for a connection once the deadline is over are reported as failed.
+            :param devices: The devices
+            :param action: The API action
+            :param deadline: The order's deadline
+            :return: dict, the outcome per device id
+            """
+            if len(devices) == 1:
+                return {devices[0].api_id: self._apply_safely(devices[0], action, deadline)}
+            devices = ZwaveMeHelper.AirtimeScheduler.interleave(devices)
+            done = self._apply_batch(devices, action, deadline)
+            # Only the devices no batch took care of are commanded individually
+            devices = list(device for device in devices if device.api_id not in done)
+            if devices:
+                with futures.ThreadPoolExecutor(max_workers=min(len(devices), self.pool_size)) as executor:
+                    outcomes = executor.map(functools.partial(self._apply_safely, action=action, deadline=deadline),
+                                            devices)
+                    done.update(zip((device.api_id for device in devices), outcomes))
+            return done
+
+        def _apply_batch(self, devices, action, deadline=None):
+            """
+            Perform the action on several devices through controller-side scripts, if the controller runs them.
+            :param devices: The devices
+            :param action: The API action
+            :param deadline: The order's deadline
+            :return: dict, the outcome per device id, without the devices to command individually
+            """
+            if not self._credentials.get(ZwaveMeHelper.ZAUTO_BATCH_ACTIONS, True):
+                return {}
+            strategy = ZwaveMeHelper.APIBatchActionStrategy(self._credentials)
+            if not strategy.supported:
+                return {}
+            return strategy.apply_blocking([list((device, action) for device in devices), deadline])
+
+    class APIBatchActionStrategy(AbstractAPIStrategy):
+        """API request strategy performing actions on several devices at once, through a controller-side script"""
+
+        URL = "/JS/Run/"
+        # Devices per script, to keep the URL within the controller's limits
+        MAX_BATCH = 32
+        # Performs the [device id, command, arguments] list and maps each device id to its success
+        SCRIPT = ("(function(c){{var r={{}};c.forEach(function(a){{try{{var d=controller.devices.get(a[0]);"
+                  "if(d){{d.performCommand(a[1],a[2]);r[a[0]]=true}}else{{r[a[0]]=false}}}}catch(e){{r[a[0]]=false}}"
+                  "}});return r}})({!s})")
+        # Whether the controllers run the scripts, per URL, unknown until tried
+        _support = {}
+
+        # noinspection SpellCheckingInspection
+        def __init__(self, zautomation_credentials):
+            """
+            Constructor of the strategy in charge of the batched actions.
+            :param zautomation_credentials: The necessary connection information.
+            """
+            super().__init__(zautomation_credentials, self.URL)
+
+        @property
+        def supported(self):
+            """
+            Whether the controller is not known to refuse the scripts.
+            :return: bool
+            """
+            return ZwaveMeHelper.APIBatchActionStrategy._support.get(self.server_url, True)
+
+        @classmethod
+        def script(cls, commands):
+            """
+            Controller-side script performing the actions.
+            :param commands: The (device, API action) pairs
+            :return: string
+            """
+            calls = []
+            for device, action in commands:
+                command, _, query = action.partition("?")
+                calls.append([device.api_id, command, dict(urllib.parse.parse_qsl(query))])
+            return cls.SCRIPT.format(json.dumps(calls, separators=(",", ":")))
+
+        def apply(self, param=None):
+            """
+            Perform the actions, by batches of MAX_BATCH devices, stopping at the first failed batch.
+            The scripts are not retried once sent, the actions possibly being performed already.
+            :param param: The (device, API action) pairs and optionally the order's deadline
+            :return: dict, the outcome per device id, without the devices left to command individually: the ones
+            of the failed batch, unless their relative actions may have been performed, and of the following ones
+            """
+            commands = param[0]
+            deadline = param[1] if len(param) > 1 else None
+            done = {}
+            for start in range(0, len(commands), self.MAX_BATCH):
+                batch = commands[start:start + self.MAX_BATCH]
+                url = self.server_full_url + urllib.parse.quote(self.script(batch), safe="")
+                self._logger.log(logging.DEBUG, "Requested for {!s} devices".format(len(batch)))
+                try:
+                    with ZwaveMeHelper.Latencies.stage("apply." + self.__class__.__name__):
+                        result = self._request(url, deadline, idempotent=False)
+                    if result.status_code in (403, 404, 405):
+                        self._logger.log(logging.INFO, "No scripts on {!s}, falling back to individual requests"
+                                         .format(self.server_url))
+                        ZwaveMeHelper.APIBatchActionStrategy._support[self.server_url] = False
+                        return done
+                    result.raise_for_status()
+                    outcome = result.json()
+                    if not isinstance(outcome, dict):
+                        raise ValueError("Unexpected script result {!s}".format(outcome))
+                except (requests.RequestException, ValueError) as error:
+                    self._logger.log(logging.ERROR, "Batch of {!s} devices failed: {!s}".format(len(batch), error))
+                    relative = ZwaveMeHelper.APIDeviceActionStrategy.RELATIVE_ACTIONS
+                    if not self._unsent(error) and any(action in relative for _, action in batch):
+                        done.update((device.api_id, False) for device, _ in batch)
+                    return done
+                done.update((device.api_id, outcome.get(device.api_id) is True) for device, _ in batch)
+            return done
+
+
+class AsyncZwaveMeHelper(ZwaveMeHelper):
+    """ Asyncio counterpart of the helper, sharing its command table and device model """
+
+    def __init__(self, credential_file_path=ZwaveMeHelper.DEFAULT_ZAUTOMATION_CREDENTIALS,
+                 cache_file_path=ZwaveMeHelper.DEFAULT_COMMANDS_CACHE):
+        """
+        Constructor.
+        :param credential_file_path: The path of the ZAutomation credentials
+        :param cache_file_path: The path of the commands cache, None to disable it
+        """
+        self._commands_lock = None
+        super().__init__(credential_file_path, cache_file_path)
+
+    async def __init_commands__(self, deadline=None):
+        """
+        Initialise the set of commands, only once even with concurrent callers.
+        :param deadline: The deadline of the order waiting for them
+        :type deadline: ZwaveMeHelper.Deadline
+        """
+        if self._commands_lock is None:
+            self._commands_lock = asyncio.Lock()
+        async with self._commands_lock:
+            if self._commands is None:
+                try:
+                    inventory = await self.APIListDeviceStrategy(self.credentials).apply([0, deadline])
+                except (requests.RequestException, ValueError, KeyError) as error:
+                    self.logger.log(logging.INFO, "No incremental synchronisation: {!s}".format(error))
+                    inventory = None
+                rooms = await self.APIListLocationStrategy(self.credentials).apply(deadline)
+                self._build_commands(rooms)
+                if inventory is not None:
+                    self._seed_states(inventory.devices)
+                self._update_time = None if inventory is None else inventory.update_time
+                self._save_commands()
+
+    async def get_vocal_commands(self):
+        """
+        Retrieve the available vocal commands.
+        :return: generator
+        """
+        if self._commands is None:
+            await self.__init_commands__()
+        return self._commands.commands()
+
+    async def do_vocal_commands(self, order=None, deadline=ZwaveMeHelper.ORDER_DEADLINE):
+        """
+        Perform the requested command.
+        :param order: The vocal order
+        :param deadline: The delay (in seconds) granted to the whole order, None for the requests' own timeouts
+        :return: ZwaveMeHelper.CommandResult, true if every targeted device performed the action
+        """
+        deadline = ZwaveMeHelper.Deadline.of(deadline)
+        with ZwaveMeHelper.Latencies.stage("order"):
+            if self._commands is None:
+                await self.__init_commands__(deadline)
+            self._refresh_if_stale()
+
+            todo = self._lookup_command(order)
+            if todo is None:
+                return ZwaveMeHelper.CommandResult(order, deadline=deadline)
+            return await self._execute(order, todo, deadline)
+
+    async def partial_order(self):
+        """
+        Start following an order while it is being transcribed.
+        :return: ZwaveMeHelper.PartialOrder, whose finish is awaitable
+        """
+        if self._commands is None:
+            await self.__init_commands__()
+        return ZwaveMeHelper.PartialOrder(self)
+
+    async def resolve_many(self, hypotheses, deadline=ZwaveMeHelper.ORDER_DEADLINE):
+        """
+        Perform the command best matching the transcription hypotheses of an order, without asking again.
+        :param hypotheses: The speech recognition's transcriptions of the order, most likely first
+        :param deadline: The delay (in seconds) granted to the whole order, None for the requests' own timeouts
+        :return: ZwaveMeHelper.CommandResult, for the chosen hypothesis
+        """
+        deadline = ZwaveMeHelper.Deadline.of(deadline)
+        with ZwaveMeHelper.Latencies.stage("order"):
+            if self._commands is None:
+                await self.__init_commands__(deadline)
+            self._refresh_if_stale()
+
+            order, todo = self._lookup_hypotheses(hypotheses)
+            if todo is None:
+                return ZwaveMeHelper.CommandResult(order, deadline=deadline)
+            return await self._execute(order, todo, deadline)
+
+    async def _execute(self, order, todo, deadline):
+        """
+        Perform a command on the devices not already in the requested state.
+        :return: ZwaveMeHelper.CommandResult
+        """
+        with ZwaveMeHelper.Latencies.stage("execute"):
+            pending, results = self._skip_noops(todo)
+            if pending:
+                results.update(await todo.strategy.apply_group(pending, todo.action, deadline))
+                self.states.record(pending, todo.action, results)
+            return ZwaveMeHelper.CommandResult(order, results, deadline)
+
+    async def do_vocal_query(self, order=None, deadline=ZwaveMeHelper.ORDER_DEADLINE):
+        """
+        Answer a question about a device's state, requesting its level only when the known one is outdated.
+        :param order: The vocal question
+        :param deadline: The delay (in seconds) granted to the whole question, None for the requests' own timeouts
+        :return: ZwaveMeHelper.QueryResult, true if the device is in the asked state
+        """
+        deadline = ZwaveMeHelper.Deadline.of(deadline)
+        if self._commands is None:
+            await self.__init_commands__(deadline)
+        self._refresh_if_stale()
+        with ZwaveMeHelper.Latencies.stage("query"):
+            question = self._parse_query(order)
+            if question is None:
+                return ZwaveMeHelper.QueryResult(order)
+            device, state = question
+            strategy = self._device_status()
+            try:
+                level = await asyncio.get_event_loop().run_in_executor(
+                    strategy.executor, self.states.fetch, device,
+                    lambda target: strategy.apply_blocking([target, deadline]))
+            except (requests.RequestException, ValueError) as error:
+                self.logger.log(logging.ERROR, "Status of {!s} unavailable: {!s}".format(device, error))
+                level = None
+            return ZwaveMeHelper.QueryResult(order, device, level, self.states.in_state(device, level, state))
+
+    class AbstractAsyncAPIStrategy(object):
+        """
+        Mixin turning a blocking strategy into an awaitable one.
+        The requests run on a worker pool sized as the connection pool, so that any number of in-flight
+        commands only ever use as many threads as there are kept-alive connections.
+        """
+
+        _executor = None
+        _executor_lock = threading.Lock()
+
+        @property
+        def executor(self):
+            """
+            Worker pool shared by all the asynchronous strategies.
+            :return: concurrent.futures.ThreadPoolExecutor
+            """
+            cls = AsyncZwaveMeHelper.AbstractAsyncAPIStrategy
+            with cls._executor_lock:
+                if cls._executor is None:
+                    cls._executor = futures.ThreadPoolExecutor(max_workers=self.pool_size)
+                return cls._executor
+
+        async def apply(self, param=None):
+            """
+            Perform the strategy's business without blocking the event loop.
+            :param param: The strategy's request parameters
+            :return: json
+            """
+            loop = asyncio.get_event_loop()
+            return await loop.run_in_executor(self.executor, self.apply_blocking, param)
+
+        def apply_blocking(self, param=None):
+            """
+            Perform the strategy's business, blocking the caller.
+            :param param: The strategy's request parameters
+            :return: json
+            """
+            return super().apply(param)
+
+    class APIListLocationStrategy(AbstractAsyncAPIStrategy, ZwaveMeHelper.APIListLocationStrategy):
+        """Asynchronous API request strategy for listing locations"""
+
+    class APIListDeviceStrategy(AbstractAsyncAPIStrategy, ZwaveMeHelper.APIListDeviceStrategy):
+        """Asynchronous API request strategy for listing the changed devices"""
+
+    class APIDeviceStatusStrategy(AbstractAsyncAPIStrategy, ZwaveMeHelper.APIDeviceStatusStrategy):
+        """Asynchronous API request strategy for reading the level of a device"""
+
+    class APIDeviceActionStrategy(AbstractAsyncAPIStrategy, ZwaveMeHelper.APIDeviceActionStrategy):
+        """Asynchronous API request strategy for activating/deactivating device"""
+
+        async def apply_group(self, devices, action, deadline=None):
+            """
+            Perform the action on several devices concurrently.
+            :param devices: The devices
+            :param action: The API action
+            :param deadline: The order's deadline
+            :return: dict, the outcome per device id
+            """
+            loop = asyncio.get_event_loop()
+            if len(devices) > 1:
+                devices = ZwaveMeHelper.AirtimeScheduler.interleave(devices)
+                done = await loop.run_in_executor(self.executor, self._apply_batch, devices, action, deadline)
+                devices = list(device for device in devices if device.api_id not in done)
+            else:
+                done = {}
+            outcomes = await asyncio.gather(*(loop.run_in_executor(self.executor, self._apply_safely, device, action,
+                                                                   deadline)
+                                              for device in devices))
+            done.update(zip((device.api_id for device in devices), outcomes))
+            return done
 
 
 def main():
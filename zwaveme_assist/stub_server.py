@@ -0,0 +1,326 @@
+#!/usr/bin/env python
+# Copyright 2017 Pierre-yves Baloche
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" Local stand-in for the ZAutomation API, to measure the helper without a Z-Way controller """
+import argparse
+import base64
+import http.server
+import io
+import json
+import logging
+import random
+import re
+import socketserver
+import threading
+import time
+import urllib.parse
+import uuid
+
+
+class ZAutomationStubServer(object):
+    """ Simulated house served through the subset of the ZAutomation API used by the helper """
+
+    BASE_URL = "/ZAutomation/api/v1"
+    SCRIPT_URL = "/JS/Run/"
+    USERNAME = "admin"
+    PASSWORD = "admin"
+    SESSION_HEADER = "ZWAYSession"
+    SWITCH_BINARY = "switchBinary"
+    # Name prefix, initial level and command id of the simulated devices, per type
+    DEVICE_TYPES = {
+        "switchBinary": ("Switch", "off", 37),
+        "switchMultilevel": ("Dimmer", 0, 38),
+        "doorlock": ("Lock", "close", 98),
+        "thermostat": ("Thermostat", 21, 67),
+        "sensorBinary": ("Detector", "off", 48),
+        "sensorMultilevel": ("Sensor", 20.5, 49)
+    }
+
+    def __init__(self, rooms=5, devices_per_room=4, latency=0.0, error_rate=0.0, host="127.0.0.1", port=0,
+                 seed=None, device_types=(SWITCH_BINARY,), scripts=True):
+        """
+        Constructor.
+        :param rooms: The number of rooms in the house
+        :param devices_per_room: The number of devices per room
+        :param latency: The delay (in seconds) added to every response
+        :param error_rate: The ratio of requests answered by an internal server error
+        :param host: The listening address
+        :param port: The listening port, 0 for any free one
+        :param seed: The seed of the error generator
+        :param device_types: The types given in turn to the devices of each room
+        :param scripts: Whether to run the helper's batch scripts, as a controller with the JS API enabled
+        """
+        self._logger = logging.getLogger(self.__class__.__name__)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.scripts = scripts
+        self.requests = 0
+        self.logins = 0
+        self._sessions = set()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._locations = []
+        self._devices = {}
+        node = 2
+        for room_id in range(1, rooms + 1):
+            self._locations.append({"id": room_id, "title": "Room {!s}".format(room_id)})
+            for index in range(devices_per_room):
+                device_type = device_types[index % len(device_types)]
+                prefix, level, command_class = self.DEVICE_TYPES[device_type]
+                device_id = "ZWayVDev_zway_{!s}-0-{!s}".format(node, command_class)
+                self._devices[device_id] = {
+                    "id": device_id,
+                    "deviceType": device_type,
+                    "location": room_id,
+                    "metrics": {"title": "{!s} {!s}".format(prefix, node), "level": level},
+                    "visibility": True,
+                    "permanently_hidden": False,
+                    "updateTime": int(time.time())
+                }
+                node += 1
+        self._server = self._Server((host, port), self._Handler)
+        self._server.stub = self
+        self._thread = None
+
+    def __str__(self):
+        """
+        Server's textual description
+        :return: str
+        """
+        return "'{!s}' ({!s} rooms, {!s} devices)".format(self.url, len(self._locations), len(self._devices))
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    @property
+    def url(self):
+        """
+        Server's URL, as expected in the credentials.
+        :return: string
+        """
+        host, port = self._server.server_address[:2]
+        return "http://{!s}:{!s}".format(host, port)
+
+    @property
+    def devices(self):
+        """
+        Simulated devices.
+        :return: list of dict
+        """
+        return list(self._devices.values())
+
+    def credentials(self):
+        """
+        Credentials giving access to the server.
+        :return: dict
+        """
+        return {"username": self.USERNAME, "password": self.PASSWORD, "server_url": self.url}
+
+    def write_credentials(self, path):
+        """
+        Write the credentials file giving access to the server.
+        :param path: The credentials file path
+        """
+        with io.open(path, 'w', encoding='utf8') as credential_file:
+            credential_file.write(json.dumps(self.credentials()))
+
+    def start(self):
+        """Serve in a background thread"""
+        self._thread = threading.Thread(target=self._server.serve_forever, name="zautomation-stub", daemon=True)
+        self._thread.start()
+        self._logger.log(logging.INFO, "Serving {!s}".format(self))
+
+    def stop(self):
+        """Stop serving"""
+        self._server.shutdown()
+        self._server.server_close()
+
+    def expire_sessions(self):
+        """Forget the opened sessions, as a controller restart would"""
+        with self._lock:
+            self._sessions.clear()
+
+    def _authenticated(self, headers):
+        if headers.get(self.SESSION_HEADER) in self._sessions:
+            return True
+        expected = base64.b64encode("{!s}:{!s}".format(self.USERNAME, self.PASSWORD).encode("utf8")).decode("ascii")
+        return headers.get("Authorization") == "Basic " + expected
+
+    def _login(self, body):
+        credentials = json.loads(body.decode("utf8") or "{}")
+        if credentials.get("login") != self.USERNAME or credentials.get("password") != self.PASSWORD:
+            return 401, self._envelope(None, 401, "Wrong login or password")
+        with self._lock:
+            self.logins += 1
+            session = uuid.uuid4().hex
+            self._sessions.add(session)
+        return 200, self._envelope({"sid": session})
+
+    def handle(self, path, headers=None, body=None):
+        """
+        Answer an API request.
+        :param path: The requested path, query included
+        :param headers: The request's headers, None not to check the authentication
+        :param body: The body of a POST request, None for a GET one
+        :return: tuple (HTTP status, JSON payload)
+        """
+        with self._lock:
+            self.requests += 1
+            failing = self._random.random() < self.error_rate
+        if self.latency:
+            time.sleep(self.latency)
+        if failing:
+            return 500, self._envelope(None, 500, "Simulated failure")
+        url = urllib.parse.urlsplit(path)
+        query = urllib.parse.parse_qs(url.query)
+        if url.path.startswith(self.SCRIPT_URL) and self.scripts:
+            if headers is not None and not self._authenticated(headers):
+                return 401, self._envelope(None, 401, "Not logged in")
+            return self._run(urllib.parse.unquote(url.path[len(self.SCRIPT_URL):]))
+        if not url.path.startswith(self.BASE_URL):
+            return 404, self._envelope(None, 404, "Not found")
+        route = url.path[len(self.BASE_URL):]
+        if body is not None:
+            if route == "/login":
+                return self._login(body)
+            return 405, self._envelope(None, 405, "Method not allowed")
+        if headers is not None and not self._authenticated(headers):
+            return 401, self._envelope(None, 401, "Not logged in")
+        if route == "/locations":
+            return 200, self._envelope(self._list_locations())
+        if route == "/devices":
+            return 200, self._envelope(self._list_devices(int(query.get("since", ["0"])[0])))
+        match = re.match(r"^/devices/(?P<id>[^/]+)$", route)
+        if match is not None:
+            device = self._devices.get(match.group("id"))
+            if device is None:
+                return 404, self._envelope(None, 404, "Device not found")
+            return 200, self._envelope(device)
+        match = re.match(r"^/devices/(?P<id>[^/]+)/command/(?P<command>[^/]+)$", route)
+        if match is not None:
+            return self._command(match.group("id"), match.group("command"), query)
+        return 404, self._envelope(None, 404, "Not found")
+
+    @staticmethod
+    def _envelope(data, code=200, error=None):
+        return {"data": data, "code": code, "message": "{!s}".format(code), "error": error}
+
+    def _list_locations(self):
+        locations = []
+        for location in self._locations:
+            namespaces = {}
+            for device in self._devices.values():
+                if device["location"] == location["id"]:
+                    entry = {"deviceId": device["id"], "deviceName": device["metrics"]["title"]}
+                    namespaces.setdefault("devices_all", []).append(entry)
+                    namespaces.setdefault("devices_" + device["deviceType"], []).append(entry)
+            locations.append(dict(location, namespaces=list({"id": namespace_id, "params": params}
+                                                            for namespace_id, params in sorted(namespaces.items()))))
+        return locations
+
+    def _list_devices(self, since):
+        return {
+            "structureChanged": False,
+            "updateTime": int(time.time()),
+            "devices": list(device for device in self._devices.values() if device["updateTime"] >= since)
+        }
+
+    def _run(self, code):
+        # Only the helper's batch script is understood: its trailing argument lists the commands to perform
+        match = re.search(r"\}\)\((?P<commands>\[.*\])\)$", code)
+        if match is None:
+            return 500, "Unsupported script"
+        done = {}
+        for device_id, command, arguments in json.loads(match.group("commands")):
+            status, _ = self._command(device_id, command, dict((key, [value]) for key, value in arguments.items()))
+            done[device_id] = status == 200
+        return 200, done
+
+    def _command(self, device_id, command, query):
+        device = self._devices.get(device_id)
+        if device is None:
+            return 404, self._envelope(None, 404, "Device not found")
+        multilevel = isinstance(self.DEVICE_TYPES[device["deviceType"]][1], (int, float))
+        with self._lock:
+            if command in ("on", "up"):
+                device["metrics"]["level"] = 99 if multilevel else "on"
+            elif command in ("off", "down"):
+                device["metrics"]["level"] = 0 if multilevel else "off"
+            elif command in ("open", "close"):
+                device["metrics"]["level"] = command
+            elif command == "exact" and "level" in query:
+                device["metrics"]["level"] = float(query["level"][0])
+            device["updateTime"] = int(time.time())
+        return 200, self._envelope(None)
+
+    class _Server(socketserver.ThreadingMixIn, http.server.HTTPServer):
+        daemon_threads = True
+
+    class _Handler(http.server.BaseHTTPRequestHandler):
+        # Keep-alive, as the Z-Way web server
+        protocol_version = "HTTP/1.1"
+        # Headers and body in a single segment, not to measure Nagle's algorithm against delayed ACKs
+        disable_nagle_algorithm = True
+        wbufsize = -1
+
+        def do_GET(self):
+            self._answer(*self.server.stub.handle(self.path, self.headers))
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            self._answer(*self.server.stub.handle(self.path, self.headers, body))
+
+        def _answer(self, status, payload):
+            body = json.dumps(payload).encode("utf8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=8083)
+    parser.add_argument("--rooms", type=int, default=5)
+    parser.add_argument("--devices", type=int, default=4, help="devices per room")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--types", default=ZAutomationStubServer.SWITCH_BINARY,
+                        help="comma separated device types, among " + ", ".join(sorted(ZAutomationStubServer.DEVICE_TYPES)))
+    parser.add_argument("--credentials", help="write the matching credentials file there")
+    parser.add_argument("--no-scripts", action="store_true", help="refuse the batch scripts, as a controller "
+                                                                   "without the JS API")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    stub = ZAutomationStubServer(args.rooms, args.devices, args.latency, args.error_rate, port=args.port,
+                                 device_types=args.types.split(","), scripts=not args.no_scripts)
+    if args.credentials:
+        stub.write_credentials(args.credentials)
+    stub.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        stub.stop()
+
+if __name__ == '__main__':
+    main()